@@ -0,0 +1,79 @@
+import asyncio
+import collections
+
+# Допуск клиентов к MediaPipe и их доля пула. Не больше max_active сессий трекера разом,
+# следующие max_waiting ждут освобождения (не дольше wait_timeout), остальным сразу отказ —
+# клиент переподключится позже, вместо того чтобы замедлять всех остальных.
+# Целевой FPS клиента: сколько кадров в секунду тянут воркеры (по скользящему среднему
+# времени hands.process) с запасом headroom, поровну на всех активных клиентов.
+
+# Общие счетчики процесса (для /metrics)
+ADMISSION_TOTALS = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+
+class TrackerAdmission:
+    def __init__(self, max_active, max_waiting, wait_timeout, workers, min_fps=2.0, max_fps=30.0, headroom=0.8):
+        self.max_active = max_active  # 0 — без ограничения
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.workers = max(1, workers)
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.headroom = headroom
+        self.active = 0
+        self.process_s = 0.02  # Скользящее среднее времени MediaPipe на кадр (до первых замеров — типичное)
+        self._waiters = collections.deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        """True — место выделено (потом обязательно release()), False — отказ: очередь полна или не дождались."""
+        if not self.max_active or self.active < self.max_active:
+            self.active += 1
+            ADMISSION_TOTALS["admitted"] += 1
+            return True
+        if len(self._waiters) >= self.max_waiting:
+            ADMISSION_TOTALS["rejected"] += 1
+            return False
+
+        ADMISSION_TOTALS["queued"] += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=self.wait_timeout)
+        except asyncio.CancelledError:
+            # Клиент ушел из очереди; если место уже успели передать — отдаем его следующему
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        if waiter.done():
+            ADMISSION_TOTALS["admitted"] += 1
+            return True
+        waiter.cancel()
+        ADMISSION_TOTALS["timed_out"] += 1
+        return False
+
+    def release(self):
+        # Место переходит первому ждущему, не освобождаясь: новички не обгоняют очередь
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def observe(self, process_s, alpha=0.05):
+        self.process_s += alpha * (process_s - self.process_s)
+
+    def target_fps(self):
+        capacity = self.workers / max(self.process_s, 1e-3) * self.headroom
+        return min(self.max_fps, max(self.min_fps, capacity / max(1, self.active)))
+
+    def saturated(self):
+        """Воркеры не тянут max_fps каждому активному клиенту."""
+        return self.target_fps() < self.max_fps
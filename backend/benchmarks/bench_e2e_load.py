@@ -0,0 +1,304 @@
+"""Сквозной нагрузочный тест бэкенда.
+
+Поднимает app из main.py в этом же процессе (uvicorn в отдельном потоке, пул
+MediaPipe — как в проде) и параллельно гоняет:
+  - N клиентов /ws/hand_tracking: кадры в NV21, BGRA8888, RGBA8888 и JPEG по кругу,
+    каждый клиент ждет ответ на кадр, как приложение;
+  - пары пиров /ws/signal/{room} с пересылкой candidate-сообщений;
+  - клиента материалов: загрузка, список с If-None-Match, скачивание с Range.
+Кадры берутся из --video (видео или папка картинок) или синтезируются.
+Результат — JSON (пропускная способность, p50/p95/p99, CPU, RSS) в stdout и в --out,
+чтобы сравнивать коммиты.
+
+    python benchmarks/bench_e2e_load.py --clients 4 --seconds 20 --out bench_e2e.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FORMATS = {"nv21": 0, "bgra": 1, "rgba": 2, "jpeg": 3}
+
+
+# --- Кадры ---
+
+def load_source_frames(path, count, width, height):
+    frames = []
+    if path and os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            image = cv2.imread(os.path.join(path, name))
+            if image is not None:
+                frames.append(image)
+            if len(frames) >= count:
+                break
+    elif path:
+        cap = cv2.VideoCapture(path)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    if not frames:
+        # Синтетика: плавный градиент с движущимся пятном и шумом, детерминированно
+        rng = np.random.default_rng(0)
+        yy, xx = np.mgrid[0:height, 0:width]
+        for i in range(count):
+            cx, cy = width * (0.3 + 0.4 * i / count), height * 0.5
+            blob = np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * (height / 8) ** 2))
+            base = np.stack([xx / width, yy / height, blob], axis=-1) * 255
+            frames.append(np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8))
+    return [cv2.resize(frame, (width, height)) for frame in frames]
+
+
+def encode_frame(bgr, format_code):
+    h, w = bgr.shape[:2]
+    header = bytes([format_code]) + w.to_bytes(4, 'little') + h.to_bytes(4, 'little') + (0).to_bytes(4, 'little', signed=True) + bytes(3)
+    if format_code == FORMATS["nv21"]:
+        i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420).reshape(-1)
+        y, u, v = i420[:h * w], i420[h * w:h * w * 5 // 4], i420[h * w * 5 // 4:]
+        vu = np.empty(u.size * 2, dtype=np.uint8)
+        vu[0::2], vu[1::2] = v, u
+        payload = np.concatenate([y, vu]).tobytes()
+    elif format_code == FORMATS["bgra"]:
+        payload = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA).tobytes()
+    elif format_code == FORMATS["rgba"]:
+        payload = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGBA).tobytes()
+    else:
+        payload = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+    return header + payload
+
+
+# --- Клиенты ---
+
+async def hand_client(port, frames, record_from, deadline, latencies):
+    import websockets
+
+    async with websockets.connect(f'ws://127.0.0.1:{port}/ws/hand_tracking', max_size=None, compression=None) as ws:
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await ws.send(frames[i % len(frames)])
+            await ws.recv()
+            if start >= record_from:  # Прогрев (первые кадры сессии MediaPipe) не считаем
+                latencies.append(time.perf_counter() - start)
+            i += 1
+
+
+async def signaling_pair(port, room_id, rate, record_from, deadline, latencies):
+    import websockets
+
+    url = f'ws://127.0.0.1:{port}/ws/signal/{room_id}'
+    async with websockets.connect(url) as sender, websockets.connect(url) as receiver:
+        await sender.recv()  # room_state
+        target = json.loads(await receiver.recv())["my_id"]
+
+        async def receive():
+            while True:
+                msg = json.loads(await receiver.recv())
+                if msg.get("type") == "candidate" and msg["sent_at"] >= record_from:
+                    latencies.append(time.perf_counter() - msg["sent_at"])
+
+        reader = asyncio.create_task(receive())
+        while time.perf_counter() < deadline:
+            await sender.send(json.dumps({"type": "candidate", "to": target, "sent_at": time.perf_counter()}))
+            await asyncio.sleep(1 / rate)
+        await asyncio.sleep(0.2)
+        reader.cancel()
+
+
+async def materials_client(port, deadline, latencies, upload_mb):
+    import httpx
+
+    async def timed(kind, request):
+        start = time.perf_counter()
+        response = await request
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        return response
+
+    payload = os.urandom(int(upload_mb * 1024 * 1024))
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=None) as client:
+        (await timed("upload", client.put('/api/rooms/bench/materials/lecture.bin', content=payload))).raise_for_status()
+        etag = None
+        while time.perf_counter() < deadline:
+            headers = {"If-None-Match": etag} if etag else {}
+            response = await timed("list", client.get('/api/rooms/bench/materials', headers=headers))
+            etag = response.headers.get("etag", etag)
+            await timed("download_range", client.get('/api/rooms/bench/materials/lecture.bin', headers={"Range": "bytes=0-65535"}))
+            await asyncio.sleep(0.05)
+
+
+# --- Ресурсы ---
+
+def proc_stats(pid):
+    """(CPU секунд, RSS МБ, пик RSS МБ) процесса по /proc; None вне Linux."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        status = {}
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                status[key] = value.strip()
+        to_mb = lambda key: int(status.get(key, '0 kB').split()[0]) / 1024  # noqa: E731
+        return cpu, to_mb('VmRSS'), to_mb('VmHWM')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ms = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def run_load(args, port, frames_by_format):
+    record_from = time.perf_counter() + args.warmup
+    deadline = record_from + args.seconds
+    hand_latencies = {name: [] for name in frames_by_format}
+    signaling_latencies, materials_latencies = [], {}
+    names = list(frames_by_format)
+    tasks = [
+        hand_client(port, frames_by_format[names[i % len(names)]], record_from, deadline, hand_latencies[names[i % len(names)]])
+        for i in range(args.clients)
+    ]
+    tasks += [signaling_pair(port, f'bench-{i}', args.signal_rate, record_from, deadline, signaling_latencies) for i in range(args.signal_rooms)]
+    if args.materials:
+        tasks.append(materials_client(port, deadline, materials_latencies, args.upload_mb))
+    await asyncio.gather(*tasks)
+    return hand_latencies, signaling_latencies, materials_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=4, help='клиентов /ws/hand_tracking (форматы по кругу)')
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=list(FORMATS))
+    parser.add_argument('--seconds', type=float, default=20.0, help='длительность замера (после прогрева)')
+    parser.add_argument('--warmup', type=float, default=3.0, help='секунд прогрева, кадры которых не учитываются')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--video', help='видео или папка картинок с записанными кадрами')
+    parser.add_argument('--frames', type=int, default=60, help='сколько кадров крутить по кругу')
+    parser.add_argument('--signal-rooms', type=int, default=2, help='комнат сигналинга (по 2 пира)')
+    parser.add_argument('--signal-rate', type=float, default=20.0, help='сообщений в секунду на комнату')
+    parser.add_argument('--no-materials', dest='materials', action='store_false')
+    parser.add_argument('--upload-mb', type=float, default=8.0)
+    parser.add_argument('--tracker-workers', type=int, help='TRACKER_WORKERS сервера (по умолчанию — из config)')
+    parser.add_argument('--out', help='куда записать JSON')
+    args = parser.parse_args()
+
+    materials_dir = tempfile.mkdtemp(prefix='bench_e2e_')
+    os.environ['MATERIALS_DIR'] = materials_dir
+    if args.tracker_workers:
+        os.environ['TRACKER_WORKERS'] = str(args.tracker_workers)
+
+    import uvicorn
+
+    import config
+    import main as server
+
+    source = load_source_frames(args.video, args.frames, args.width, args.height)
+    frames_by_format = {name: [encode_frame(frame, FORMATS[name]) for frame in source] for name in args.formats}
+
+    port = free_port()
+    uv_server = uvicorn.Server(uvicorn.Config(server.app, host='127.0.0.1', port=port, log_level='warning', ws_max_size=64 * 1024 * 1024))
+    thread = threading.Thread(target=uv_server.run, name='uvicorn', daemon=True)
+    thread.start()
+    while not uv_server.started:
+        time.sleep(0.05)
+
+    worker_pids = [p.pid for p in server.tracker_pool._processes]
+    cpu_before = resource.getrusage(resource.RUSAGE_SELF)
+    workers_before = {pid: proc_stats(pid) for pid in worker_pids}
+    wall_start = time.perf_counter()
+    try:
+        hand, signaling, materials = asyncio.run(run_load(args, port, frames_by_format))
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu_after = resource.getrusage(resource.RUSAGE_SELF)
+        workers_after = {pid: proc_stats(pid) for pid in worker_pids}
+        uv_server.should_exit = True
+        thread.join(timeout=10)
+        shutil.rmtree(materials_dir, ignore_errors=True)
+
+    process_cpu = (cpu_after.ru_utime + cpu_after.ru_stime) - (cpu_before.ru_utime + cpu_before.ru_stime)
+    workers_cpu = sum(
+        after[0] - before[0]
+        for pid, after in workers_after.items()
+        if after is not None and (before := workers_before.get(pid)) is not None
+    )
+    self_stats = proc_stats(os.getpid())
+    all_frames = [latency for values in hand.values() for latency in values]
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "params": {
+            "clients": args.clients, "formats": args.formats, "seconds": args.seconds,
+            "warmup": args.warmup, "frame_size": [args.width, args.height], "source": args.video or "synthetic",
+            "signal_rooms": args.signal_rooms, "signal_rate": args.signal_rate,
+            "materials": args.materials, "tracker_workers": config.TRACKER_WORKERS,
+        },
+        "hand_tracking": {
+            "fps_total": round(len(all_frames) / args.seconds, 2),
+            "latency": percentiles(all_frames),
+            "by_format": {name: {"fps": round(len(values) / args.seconds, 2), "latency": percentiles(values)} for name, values in hand.items()},
+        },
+        "signaling": {"messages_per_s": round(len(signaling) / args.seconds, 2), "latency": percentiles(signaling)},
+        "materials": {kind: percentiles(values) for kind, values in materials.items()},
+        "resources": {
+            "wall_s": round(wall, 3),
+            # Клиенты живут в этом же процессе, так что его CPU — сервер плюс нагрузка
+            "process_cpu_s": round(process_cpu, 3),
+            "tracker_workers_cpu_s": round(workers_cpu, 3),
+            "cpu_utilization": round((process_cpu + workers_cpu) / wall, 3),
+            "process_rss_mb": round(self_stats[1], 1) if self_stats else None,
+            "process_peak_rss_mb": round(self_stats[2], 1) if self_stats else None,
+            "tracker_workers_rss_mb": round(sum(s[1] for s in workers_after.values() if s), 1) if worker_pids else None,
+        },
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Бенчмарк декодирования кадров /ws/hand_tracking по format_code.
+
+Сравнивает старый путь (frombuffer -> cvtColor -> rotate -> flip) с FrameDecoder
+и печатает мкс/кадр и пиковые временные аллокации (tracemalloc) на кадр.
+
+    python benchmarks/bench_frame_decode.py --width 1280 --height 720 --rotation 90
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_decoder import FORMAT_BGRA, FORMAT_NV21, FORMAT_RGBA, FrameDecoder  # noqa: E402
+
+FORMAT_JPEG = 3
+ROTATE_CODES = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+
+
+def make_frame(format_code, w, h, rotation):
+    rng = np.random.default_rng(format_code)
+    header = bytes([format_code]) + w.to_bytes(4, 'little') + h.to_bytes(4, 'little') \
+        + rotation.to_bytes(4, 'little', signed=True) + bytes(3)
+    if format_code == FORMAT_NV21:
+        payload = rng.integers(0, 256, (h + h // 2) * w, dtype=np.uint8).tobytes()
+    elif format_code in (FORMAT_BGRA, FORMAT_RGBA):
+        payload = rng.integers(0, 256, h * w * 4, dtype=np.uint8).tobytes()
+    else:
+        image = cv2.GaussianBlur(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), (9, 9), 0)
+        payload = cv2.imencode('.jpg', image)[1].tobytes()
+    return header + payload
+
+
+def legacy_decode(data):
+    # Копия конвейера из main.py до появления FrameDecoder
+    format_code = data[0]
+    w = int.from_bytes(data[1:5], byteorder='little')
+    h = int.from_bytes(data[5:9], byteorder='little')
+    rotation = int.from_bytes(data[9:13], byteorder='little', signed=True)
+    img_data = data[16:]
+    if format_code == FORMAT_NV21:
+        img = cv2.cvtColor(np.frombuffer(img_data, np.uint8).reshape((h + h // 2, w)), cv2.COLOR_YUV2BGR_NV21)
+    elif format_code == FORMAT_BGRA:
+        img = cv2.cvtColor(np.frombuffer(img_data, np.uint8).reshape((h, w, 4)), cv2.COLOR_BGRA2BGR)
+    elif format_code == FORMAT_RGBA:
+        img = cv2.cvtColor(np.frombuffer(img_data, np.uint8).reshape((h, w, 4)), cv2.COLOR_RGBA2RGB)
+    else:
+        img = cv2.imdecode(np.frombuffer(img_data, np.uint8), cv2.IMREAD_COLOR)
+    if rotation in ROTATE_CODES:
+        img = cv2.rotate(img, ROTATE_CODES[rotation])
+    return cv2.flip(img, 1)
+
+
+def measure(decode, data, frames):
+    decode(data)  # Прогрев: буферы декодера выделяются на первом кадре
+    start = time.perf_counter()
+    for _ in range(frames):
+        decode(data)
+    us_per_frame = (time.perf_counter() - start) / frames * 1e6
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    decode(data)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return us_per_frame, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--rotation', type=int, default=90, choices=[0, 90, 180, 270])
+    parser.add_argument('--max-side', type=int, default=640, help='рабочее разрешение FrameDecoder (0 — без уменьшения)')
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Кадр {args.width}x{args.height}, поворот {args.rotation}, рабочая сторона {args.max_side or 'исходная'}")
+    print(f"{'format':<10}{'legacy мкс':>12}{'legacy КБ':>12}{'decoder мкс':>14}{'decoder КБ':>13}")
+    for format_code, name in ((FORMAT_NV21, 'NV21'), (FORMAT_BGRA, 'BGRA'), (FORMAT_RGBA, 'RGBA'), (FORMAT_JPEG, 'JPEG')):
+        data = make_frame(format_code, args.width, args.height, args.rotation)
+        decoder = FrameDecoder(max_side=args.max_side)
+        legacy_us, legacy_peak = measure(legacy_decode, data, args.frames)
+        decoder_us, decoder_peak = measure(decoder.decode, data, args.frames)
+        print(f"{name:<10}{legacy_us:>12.0f}{legacy_peak / 1024:>12.0f}{decoder_us:>14.0f}{decoder_peak / 1024:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Пропуск отставших кадров: старый цикл wait_for(..., 0.001) против LatestFrameMailbox.
+
+Фейковый сокет получает кадры с частотой камеры (метка времени захвата внутри),
+обработка кадра — sleep(--process-ms) (MediaPipe в пуле процессов тоже не держит цикл).
+Печатает возраст кадра к моменту ответа (p50/p99), сколько кадров обработано и
+пропущено и CPU-время процесса на обработанный кадр.
+
+    python benchmarks/bench_frame_mailbox.py --fps 30 --process-ms 45 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_mailbox import LatestFrameMailbox  # noqa: E402
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def receive_bytes(self):
+        return await self.queue.get()
+
+
+async def camera(ws, fps, seconds):
+    # Кадр несет только время захвата; размер тут не важен
+    frames = int(fps * seconds)
+    start = time.perf_counter()
+    for i in range(frames):
+        await asyncio.sleep(max(0.0, start + i / fps - time.perf_counter()))
+        ws.queue.put_nowait(time.perf_counter())
+    return frames
+
+
+async def run_legacy(ws, process_s, stop, ages, dropped):
+    while not stop.is_set():
+        try:
+            data = await asyncio.wait_for(ws.receive_bytes(), timeout=0.1)
+        except asyncio.TimeoutError:
+            continue
+        try:
+            while True:
+                data = await asyncio.wait_for(ws.receive_bytes(), timeout=0.001)
+                dropped[0] += 1
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(process_s)
+        ages.append(time.perf_counter() - data)
+
+
+async def run_mailbox(ws, process_s, stop, ages, dropped):
+    mailbox = LatestFrameMailbox()
+    reader = asyncio.create_task(mailbox.pump(ws.receive_bytes))
+    try:
+        while not stop.is_set():
+            try:
+                data = await asyncio.wait_for(mailbox.get(), timeout=0.1)
+            except asyncio.TimeoutError:
+                continue
+            await asyncio.sleep(process_s)
+            ages.append(time.perf_counter() - data)
+    finally:
+        reader.cancel()
+        dropped[0] = mailbox.dropped
+
+
+async def measure(runner, fps, process_s, seconds):
+    ws, stop, ages, dropped = FakeWebSocket(), asyncio.Event(), [], [0]
+    cpu_start = time.process_time()
+    consumer = asyncio.create_task(runner(ws, process_s, stop, ages, dropped))
+    sent = await camera(ws, fps, seconds)
+    await asyncio.sleep(process_s * 2)
+    stop.set()
+    await consumer
+    cpu = time.process_time() - cpu_start
+    return np.array(ages) * 1000, sent, dropped[0], cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--process-ms', type=float, default=45.0, help='время обработки кадра (медленнее камеры)')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'схема':>8}{'возраст p50 мс':>16}{'p99 мс':>10}{'обработано':>12}{'пропущено':>11}{'CPU мкс/кадр':>14}")
+    for name, runner in (('legacy', run_legacy), ('mailbox', run_mailbox)):
+        ages, sent, dropped, cpu = asyncio.run(measure(runner, args.fps, args.process_ms / 1000, args.seconds))
+        print(f"{name:>8}{np.percentile(ages, 50):>16.1f}{np.percentile(ages, 99):>10.1f}{len(ages):>12}{dropped:>11}"
+              f"{cpu / max(1, len(ages)) * 1e6:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
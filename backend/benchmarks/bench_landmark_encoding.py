@@ -0,0 +1,55 @@
+"""Бенчмарк ответов /ws/hand_tracking: JSON против бинарного формата.
+
+Печатает мкс на кодирование и байт на кадр для 0, 1 и 2 рук.
+
+    python benchmarks/bench_landmark_encoding.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from landmark_codec import BinaryHandsEncoder, JsonHandsEncoder  # noqa: E402
+
+SUBTITLES = ['Привет', 'Да', 'Нет', 'Спасибо', 'Пока']
+
+
+def make_hands(count):
+    rng = np.random.default_rng(count)
+    return [(label, rng.random((21, 3), dtype=np.float32)) for label in ('Left', 'Right')[:count]]
+
+
+def measure(encoder, hands, frames):
+    payload = encoder.encode(hands, 'Да')
+    start = time.perf_counter()
+    for _ in range(frames):
+        encoder.encode(hands, 'Да')
+    us = (time.perf_counter() - start) / frames * 1e6
+    size = len(payload) if isinstance(payload, bytes) else len(payload.encode('utf-8'))
+    return us, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=5000)
+    args = parser.parse_args()
+
+    encoders = (
+        ('json', JsonHandsEncoder()),
+        ('binary f32', BinaryHandsEncoder(SUBTITLES, 'float32')),
+        ('binary f16', BinaryHandsEncoder(SUBTITLES, 'float16')),
+    )
+    print(f"{'формат':<12}{'рук':>5}{'мкс/кадр':>11}{'байт/кадр':>11}")
+    for count in (0, 1, 2):
+        hands = make_hands(count)
+        for name, encoder in encoders:
+            us, size = measure(encoder, hands, args.frames)
+            print(f"{name:<12}{count:>5}{us:>11.1f}{size:>11}")
+
+
+if __name__ == '__main__':
+    main()
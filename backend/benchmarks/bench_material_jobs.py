@@ -0,0 +1,109 @@
+"""Генерация лекций: прямо в обработчике против MaterialJobQueue.
+
+Фейковый генератор спит и крутит CPU (имитация нейросети). Запросы приходят
+пачкой, часть из них — дубли одной темы. Печатает время ответа на запрос,
+максимальную задержку цикла событий (насколько бы замерли сокеты трекинга),
+сколько раз реально запускался генератор и общее время.
+
+    python benchmarks/bench_material_jobs.py --requests 12 --duplicates 4 --sleep-ms 200 --spin-ms 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from material_jobs import MaterialJobQueue  # noqa: E402
+
+
+def make_fake_generator(sleep_s, spin_s, runs):
+    def generate(title, description, progress):
+        runs.append(title)
+        for step in range(1, 11):
+            time.sleep(sleep_s / 10)
+            deadline = time.perf_counter() + spin_s / 10
+            while time.perf_counter() < deadline:
+                pass
+            progress(step / 10)
+        return f"Лекция: {title}\n\n{description}\n"
+    return generate
+
+
+async def watch_loop_lag(stop, lags, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+def make_requests(count, duplicates):
+    # Первые duplicates запросов — одна и та же тема (весь класс нажал кнопку)
+    return [("Тема", "Описание") if i < duplicates else (f"Тема {i}", "Описание") for i in range(count)]
+
+
+async def run_inline(requests, generator):
+    # Время ответа считаем от прихода пачки: запросы ждут, пока цикл занят чужой генерацией
+    start = time.perf_counter()
+
+    async def handler(title, description):
+        generator(title, description, lambda fraction: None)
+        return time.perf_counter() - start
+    return await asyncio.gather(*(handler(*req) for req in requests))
+
+
+async def run_queued(requests, generator, workers, materials_dir):
+    queue = MaterialJobQueue(generator=generator, max_workers=workers)
+    jobs, latencies = [], []
+    start = time.perf_counter()
+    for title, description in requests:
+        job, _ = queue.submit("bench", materials_dir, title, description)
+        latencies.append(time.perf_counter() - start)
+        jobs.append(job)
+        await asyncio.sleep(0)
+    await asyncio.gather(*(job.done.wait() for job in jobs))
+    await queue.close()
+    return latencies
+
+
+async def measure(runner):
+    stop, lags = asyncio.Event(), []
+    watcher = asyncio.create_task(watch_loop_lag(stop, lags))
+    start = time.perf_counter()
+    latencies = await runner()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await watcher
+    return np.array(latencies) * 1000, max(lags, default=0.0) * 1000, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=12)
+    parser.add_argument('--duplicates', type=int, default=4, help='сколько запросов — одна и та же тема')
+    parser.add_argument('--sleep-ms', type=float, default=200.0, help='ожидание генератора (I/O, GPU)')
+    parser.add_argument('--spin-ms', type=float, default=50.0, help='чистый CPU генератора')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    requests = make_requests(args.requests, args.duplicates)
+    materials_dir = tempfile.mkdtemp(prefix='bench_jobs_')
+    print(f"{'схема':>8}{'ответ p50 мс':>14}{'ответ max мс':>14}{'лаг цикла мс':>14}{'запусков':>10}{'время, с':>10}")
+    for name in ('inline', 'queued'):
+        runs = []
+        generator = make_fake_generator(args.sleep_ms / 1000, args.spin_ms / 1000, runs)
+        if name == 'inline':
+            runner = lambda: run_inline(requests, generator)  # noqa: E731
+        else:
+            runner = lambda: run_queued(requests, generator, args.workers, materials_dir)  # noqa: E731
+        latencies, lag, elapsed = asyncio.run(measure(runner))
+        print(f"{name:>8}{np.percentile(latencies, 50):>14.2f}{latencies.max():>14.2f}{lag:>14.1f}{len(runs):>10}{elapsed:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
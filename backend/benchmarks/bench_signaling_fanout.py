@@ -0,0 +1,90 @@
+"""Нагрузочный тест ретрансляции сигналинга на фейковых WebSocket-пирах.
+
+Сравнивает старую схему (json.dumps и await send_text по очереди для каждого
+получателя) с очередями PeerConnection. В комнате один медленный пир, остальные
+быстрые; печатается p50/p99 задержки доставки быстрым пирам от размера комнаты.
+
+    python benchmarks/bench_signaling_fanout.py --sizes 3 8 32 128 --slow-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_bus import InMemoryRoomBus  # noqa: E402
+from signaling import SLOW_PEER_DROP, PeerConnection, make_local_delivery, relay  # noqa: E402
+
+
+class FakeWebSocket:
+    def __init__(self, delay, latencies):
+        self.delay = delay
+        self.latencies = latencies
+
+    async def send_text(self, text):
+        # Имитация сети: даже быстрый пир отдает управление циклу событий
+        await asyncio.sleep(self.delay)
+        if self.latencies is not None:
+            sent_at = json.loads(text)["sent_at"]
+            self.latencies.append(time.perf_counter() - sent_at)
+
+    async def close(self, code=1000):
+        pass
+
+
+async def run_legacy(size, messages, slow_delay):
+    latencies = []
+    peers = {str(i): FakeWebSocket(slow_delay if i == 1 else 0, None if i == 1 else latencies) for i in range(size)}
+    for _ in range(messages):
+        msg = {"type": "candidate", "sent_at": time.perf_counter(), "from": "0"}
+        for pid, ws in list(peers.items()):
+            if pid != "0":
+                await ws.send_text(json.dumps(msg))
+    return latencies
+
+
+async def run_queued(size, messages, slow_delay):
+    latencies = []
+    room = {}
+    bus = InMemoryRoomBus(make_local_delivery({"bench": room}))
+    for i in range(size):
+        ws = FakeWebSocket(slow_delay if i == 1 else 0, None if i == 1 else latencies)
+        # Для замера медленного пира не отключаем, а отбрасываем лишнее
+        peer = PeerConnection(str(i), ws, queue_size=messages + 1, slow_peer_policy=SLOW_PEER_DROP)
+        peer.start()
+        room[str(i)] = peer
+        await bus.join("bench", str(i))
+    for _ in range(messages):
+        await relay(bus, "bench", "0", {"type": "candidate", "sent_at": time.perf_counter()})
+        await asyncio.sleep(0)
+    expected = (size - 2) * messages
+    while len(latencies) < expected:
+        await asyncio.sleep(0.001)
+    for peer in room.values():
+        await peer.stop()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3, 8, 32, 128])
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--slow-ms', type=float, default=20.0, help='задержка отправки медленному пиру')
+    args = parser.parse_args()
+
+    print(f"{'пиров':>6}{'схема':>10}{'p50 мс':>10}{'p99 мс':>10}")
+    for size in args.sizes:
+        if size < 3:
+            size = 3  # Отправитель, медленный пир и хотя бы один быстрый
+        for name, runner in (('legacy', run_legacy), ('queued', run_queued)):
+            latencies = np.array(asyncio.run(runner(size, args.messages, args.slow_ms / 1000))) * 1000
+            print(f"{size:>6}{name:>10}{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 99):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
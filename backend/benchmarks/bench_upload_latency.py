@@ -0,0 +1,158 @@
+"""Влияние загрузки материалов на задержку /ws/hand_tracking.
+
+Поднимает сервер (uvicorn в отдельном процессе, материалы во временной папке).
+Один клиент непрерывно шлет RGBA кадры в /ws/hand_tracking и меряет время до
+ответа, пока параллельно идут загрузки больших файлов: старым обработчиком
+(shutil.copyfileobj прямо в цикле событий), затем текущими POST .../materials/upload
+(multipart) и PUT .../materials/{filename} (сырое тело). Печатает p50/p99/max
+задержки кадра и время загрузок.
+
+    python benchmarks/bench_upload_latency.py --uploads 4 --size-mb 100
+"""
+import argparse
+import asyncio
+import io
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+LEGACY_URL = '/bench/legacy/{room_id}/upload'
+
+
+def serve(port):
+    # Серверный процесс: приложение из main.py плюс старый обработчик загрузки для сравнения
+    import uvicorn
+    from fastapi import File, UploadFile
+
+    import config
+    import main as server
+
+    async def legacy_upload(room_id: str, file: UploadFile = File(...)):
+        room_dir = os.path.join(config.MATERIALS_DIR, room_id)
+        os.makedirs(room_dir, exist_ok=True)
+        with open(os.path.join(room_dir, file.filename), 'wb') as buffer:
+            shutil.copyfileobj(file.file, buffer)
+        return {'status': 'success', 'filename': file.filename}
+
+    server.app.add_api_route(LEGACY_URL, legacy_upload, methods=['POST'])
+    uvicorn.run(server.app, host='127.0.0.1', port=port, log_level='warning', ws_max_size=64 * 1024 * 1024)
+
+
+def make_frame(w, h):
+    header = bytes([2]) + w.to_bytes(4, 'little') + h.to_bytes(4, 'little') + bytes(4) + bytes(3)
+    return header + np.random.default_rng(0).integers(0, 256, h * w * 4, dtype=np.uint8).tobytes()
+
+
+async def measure_frames(port, frame, stop, latencies, warmed_up):
+    import websockets
+
+    # Без permessage-deflate: мобильный клиент кадры не сжимает
+    async with websockets.connect(f'ws://127.0.0.1:{port}/ws/hand_tracking', max_size=None, compression=None) as ws:
+        frames = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            await ws.send(frame)
+            await ws.recv()
+            frames += 1
+            if frames > 5:  # Первые кадры сессии медленнее
+                latencies.append(time.perf_counter() - start)
+                warmed_up.set()
+
+
+async def upload(client, kind, i, payload, chunk_size=64 * 1024):
+    name = f'lecture_{i}.bin'
+    if kind == 'legacy':
+        response = await client.post(LEGACY_URL.format(room_id='bench'), files={'file': (name, io.BytesIO(payload))})
+    elif kind == 'multipart':
+        response = await client.post('/api/rooms/bench/materials/upload', files={'file': (name, io.BytesIO(payload))})
+    else:
+        async def body():
+            for offset in range(0, len(payload), chunk_size):
+                yield payload[offset:offset + chunk_size]
+        response = await client.put(f'/api/rooms/bench/materials/{name}', content=body())
+    response.raise_for_status()
+
+
+async def run_phase(port, frame, kind, uploads, payload, idle_s):
+    import httpx
+
+    latencies = []
+    stop, warmed_up = threading.Event(), threading.Event()
+    # Клиент кадров в своем потоке и цикле событий, чтобы загрузки не мешали замеру на стороне клиента
+    tracker = threading.Thread(target=asyncio.run, args=(measure_frames(port, frame, stop, latencies, warmed_up),))
+    tracker.start()
+    await asyncio.to_thread(warmed_up.wait)
+    latencies.clear()
+    started = time.perf_counter()
+    if kind is None:
+        await asyncio.sleep(idle_s)
+    else:
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=None) as client:
+            await asyncio.gather(*(upload(client, kind, i, payload) for i in range(uploads)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.to_thread(tracker.join)
+    return np.array(latencies) * 1000, elapsed
+
+
+def wait_for_port(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f'Сервер не поднялся на порту {port}')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=4, help='параллельных загрузок')
+    parser.add_argument('--size-mb', type=int, default=100)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--idle-s', type=float, default=3.0, help='длительность замера без загрузок')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    port = free_port()
+    materials_dir = tempfile.mkdtemp(prefix='bench_materials_')
+    env = dict(os.environ, MATERIALS_DIR=materials_dir, MATERIALS_MAX_UPLOAD_MB='0')
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)], cwd=BACKEND_DIR, env=env)
+    try:
+        wait_for_port(port)
+        frame = make_frame(args.width, args.height)
+        payload = os.urandom(args.size_mb * 1024 * 1024)
+        print(f"\n{'фаза':>14}{'кадров':>8}{'p50 мс':>10}{'p99 мс':>10}{'max мс':>10}{'время, с':>10}")
+        for kind in (None, 'legacy', 'multipart', 'put'):
+            latencies, elapsed = asyncio.run(run_phase(port, frame, kind, args.uploads, payload, args.idle_s))
+            print(f"{kind or 'без загрузок':>14}{len(latencies):>8}{np.percentile(latencies, 50):>10.1f}"
+                  f"{np.percentile(latencies, 99):>10.1f}{latencies.max():>10.1f}{elapsed:>10.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(materials_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
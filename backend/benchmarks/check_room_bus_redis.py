@@ -0,0 +1,115 @@
+"""Проверка RedisRoomBus на fakeredis: два воркера в одной комнате и обрыв связи с Redis.
+
+Две шины (как два процесса uvicorn) на одном сервере fakeredis обмениваются адресными
+и широковещательными сообщениями. Затем Redis «падает»: соединения рвутся, после
+подъема данные пустые, как после рестарта. Шины должны сами переподписаться на каналы
+и вернуть своих пиров в комнату, после чего обмен снова идет в обе стороны.
+
+    python benchmarks/check_room_bus_redis.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_bus import RedisRoomBus  # noqa: E402
+
+
+def make_bus(server, name, received, heartbeat_ttl):
+    import fakeredis
+
+    def deliver(room_id, text, target, exclude):
+        received.append((name, room_id, text, target, exclude))
+
+    client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    return RedisRoomBus(deliver, client=client, heartbeat_ttl=heartbeat_ttl)
+
+
+async def wait_for(condition, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if await condition():
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def exchange(a, b, received, tag, timeout):
+    """B пишет адресно пиру x на A, A — всем, кроме x: каждое должно дойти ровно до другой шины."""
+    received.clear()
+    await b.publish("1", f"{tag}:to-x", target="x")
+    await a.publish("1", f"{tag}:to-all", exclude="x")
+    expected = {("A", "1", f"{tag}:to-x", "x", None), ("B", "1", f"{tag}:to-all", None, "x")}
+
+    async def delivered():
+        return expected <= set(received)
+    return await wait_for(delivered, timeout)
+
+
+async def run(args):
+    import fakeredis
+
+    server = fakeredis.FakeServer()
+    received = []
+    a = make_bus(server, "A", received, args.heartbeat_ttl)
+    b = make_bus(server, "B", received, args.heartbeat_ttl)
+    await a.start()
+    await b.start()
+    results = []
+    try:
+        results.append(("join", await a.join("1", "x") == [] and await b.join("1", "y") == ["x"]))
+        results.append(("room_size", await a.room_size("1") == 2 and await b.is_member("1", "x")))
+        results.append(("exchange", await exchange(a, b, received, "before", args.timeout)))
+
+        # Обрыв: команды падают, подписки рвутся
+        server.connected = False
+        for bus in (a, b):
+            await bus._pubsub.connection.disconnect()
+        try:
+            await b.publish("1", "lost")
+            results.append(("publish during outage fails", False))
+        except Exception:
+            results.append(("publish during outage fails", True))
+        await asyncio.sleep(args.outage)
+
+        # Подъем после рестарта: ни ключей воркеров, ни комнат
+        server.connected = True
+        await fakeredis.aioredis.FakeRedis(server=server).flushall()
+
+        async def restored():
+            return await a.room_size("1") == 2
+        results.append(("members re-registered", await wait_for(restored, args.timeout)))
+
+        async def resubscribed():
+            # pub/sub не хранит сообщения, опубликованные до переподписки: стучимся, пока обе шины не услышат
+            await a.publish("1", "probe", target="y")
+            await b.publish("1", "probe", target="x")
+            return {name for name, _, text, _, _ in received if text == "probe"} == {"A", "B"}
+        results.append(("channels resubscribed", await wait_for(resubscribed, args.timeout)))
+        results.append(("exchange after reconnect", await exchange(a, b, received, "after", args.timeout)))
+
+        await a.leave("1", "x")
+        results.append(("leave", await b.room_size("1") == 1 and await a.find_available_room() == "2"))
+    finally:
+        await a.close()
+        await b.close()
+
+    for name, ok in results:
+        print(f"{'[+]' if ok else '[-]'} {name}")
+    return all(ok for _, ok in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--heartbeat-ttl', type=int, default=2, help='TTL ключа воркера, с (пульс — раз в TTL/3)')
+    parser.add_argument('--outage', type=float, default=3.0, help='сколько секунд Redis недоступен')
+    parser.add_argument('--timeout', type=float, default=15.0, help='сколько ждать доставки и восстановления')
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == '__main__':
+    main()
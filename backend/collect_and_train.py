@@ -1,19 +1,25 @@
+import argparse
 import cv2
+import json
 import numpy as np
 import os
 import mediapipe as mp
-from sklearn.model_selection import train_test_split
+from sequence_buffer import KeypointRingBuffer
+from gesture_dataset import GestureDataset
+from gesture_training import SequenceSource, make_tf_dataset, split_indices
 
+# TensorFlow импортируется внутри функций обучения/экспорта:
+# extract_keypoints() и сбор данных (в т.ч. в процессах extract_videos.py) без них стартуют мгновенно
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
-from tensorflow.keras.utils import to_categorical
 
 mp_hands = mp.solutions.hands
 mp_drawing = mp.solutions.drawing_utils
 
 # --- НАСТРОЙКИ ---
-DATA_PATH = os.path.join(os.path.dirname(__file__), 'MP_Data')
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'MP_Data')  # Старый формат: один .npy на кадр (только для импорта)
+DATASET_PATH = os.path.join(os.path.dirname(__file__), 'dataset')
+HOLDOUT_PATH = os.path.join(os.path.dirname(__file__), 'gesture_holdout.npz')  # Отложенная выборка для quantize_model.py
+CHECKPOINT_PATH = os.path.join(os.path.dirname(__file__), 'gesture_model.best.keras')  # Лучшая эпоха текущего обучения
 
 # ТУТ ПИШИ СВОИ ЖЕСТЫ!
 actions = np.array(['Привет', 'Да', 'Нет', 'Спасибо', 'Пока']) 
@@ -21,14 +27,6 @@ actions = np.array(['Привет', 'Да', 'Нет', 'Спасибо', 'Пок
 no_sequences = 30     # Количество "дублей" для каждого жеста
 sequence_length = 30  # Количество кадров в "дубле" (примерно 1 секунда видео)
 
-def prepare_folders():
-    for action in actions:
-        for sequence in range(no_sequences):
-            try:
-                os.makedirs(os.path.join(DATA_PATH, action, str(sequence)))
-            except:
-                pass
-
 def extract_keypoints(results):
     lh = np.zeros(21*3)
     rh = np.zeros(21*3)
@@ -43,7 +41,7 @@ def extract_keypoints(results):
     return np.concatenate([lh, rh])
 
 def collect_data():
-    prepare_folders()
+    dataset = GestureDataset(DATASET_PATH, sequence_length=sequence_length)
     cap = cv2.VideoCapture(0)
     with mp_hands.Hands(min_detection_confidence=0.5, min_tracking_confidence=0.5, max_num_hands=2) as hands:
         for action in actions:
@@ -51,6 +49,8 @@ def collect_data():
             cv2.waitKey(2000) 
             
             for sequence in range(no_sequences):
+                # Тот же буфер окна, что и на сервере: дубль сохраняем целиком в конце
+                window = KeypointRingBuffer(length=sequence_length, size=126)
                 for frame_num in range(sequence_length):
                     ret, frame = cap.read()
                     
@@ -85,9 +85,7 @@ def collect_data():
                         cv2.putText(image, f'{action} | Дубль {sequence + 1}/{no_sequences}', (15, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
                         cv2.imshow('Сбор данных жестов', image)
                     
-                    keypoints = extract_keypoints(results)
-                    npy_path = os.path.join(DATA_PATH, action, str(sequence), str(frame_num))
-                    np.save(npy_path, keypoints)
+                    window.push(extract_keypoints(results))
 
                     if cv2.waitKey(10) & 0xFF == ord('q'):
                         print("Прервано пользователем.")
@@ -95,61 +93,74 @@ def collect_data():
                         cv2.destroyAllWindows()
                         return
 
+                if window.is_full:
+                    dataset.append(action, window.view())
+
         cap.release()
         cv2.destroyAllWindows()
         print("\n[+] СБОР ДАННЫХ УСПЕШНО ОКОНЧЕН!")
 
-def train_model():
+def export_model(model, npz_path):
+    from tensorflow.keras.layers import LSTM, Dense
+
+    # Выгружаем веса в .npz для gesture_runtime.NumpyGestureModel: серверу больше не нужен TensorFlow
+    spec, arrays = [], {}
+    for i, layer in enumerate(model.layers):
+        config = layer.get_config()
+        if isinstance(layer, LSTM):
+            kernel, recurrent_kernel, bias = layer.get_weights()
+            spec.append({
+                "type": "lstm",
+                "activation": config["activation"],
+                "recurrent_activation": config["recurrent_activation"],
+                "return_sequences": config["return_sequences"],
+            })
+            arrays[f"{i}/recurrent_kernel"] = recurrent_kernel.astype(np.float32)
+        elif isinstance(layer, Dense):
+            kernel, bias = layer.get_weights()
+            spec.append({"type": "dense", "activation": config["activation"]})
+        else:
+            raise ValueError(f"Слой {layer.name} не поддерживается экспортом в NumPy")
+        arrays[f"{i}/kernel"] = kernel.astype(np.float32)
+        arrays[f"{i}/bias"] = bias.astype(np.float32)
+
+    np.savez_compressed(npz_path, spec=np.array(json.dumps(spec)), **arrays)
+    print(f"[+] Модель экспортирована для сервера (без TensorFlow): {npz_path}")
+
+def export_saved_model():
+    from tensorflow.keras.models import load_model
+    base_dir = os.path.dirname(__file__)
+    model = load_model(os.path.join(base_dir, 'gesture_model.h5'))
+    export_model(model, os.path.join(base_dir, 'gesture_model.npz'))
+
+def train_model(epochs=300, patience=20, batch_size=32, val_split=0.1, test_split=0.05, augment=True, seed=0):
+    from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense
+
     print("\n--- Загрузка данных для обучения ---")
-    sequences, labels = [], []
-    # Собираем только то, что удалось успешно отснять
-    valid_actions = []
-    
-    for action in actions:
-        action_has_data = False
-        for sequence in range(no_sequences):
-            window = []
-            is_valid_sequence = True
-            for frame_num in range(sequence_length):
-                npy_path = os.path.join(DATA_PATH, action, str(sequence), f"{frame_num}.npy")
-                if os.path.exists(npy_path):
-                    res = np.load(npy_path)
-                    window.append(res)
-                else:
-                    is_valid_sequence = False
-                    break # Если не хватает кадров, пропускаем этот дубль
-                    
-            if is_valid_sequence:
-                sequences.append(window)
-                # Пока складируем оригинальные строки (Названия жестов) вместо индексов!
-                labels.append(action)
-                action_has_data = True
-                
-        if action_has_data:
-            valid_actions.append(action)
-
-    if len(sequences) == 0:
+    dataset = GestureDataset(DATASET_PATH, sequence_length=sequence_length)
+    # Собираем только то, что удалось успешно отснять. Дубли жеста — memmap, в память их не копируем
+    valid_actions = [action for action in actions if dataset.count(action) > 0]
+
+    if len(valid_actions) == 0:
         print("\n[!] ОШИБКА: Нет записанных данных для обучения!")
-        print("Пожалуйста, сначала запусти пункт 1 и запиши жесты на камеру.")
+        print("Пожалуйста, сначала запиши жесты на камеру (collect_and_train.py collect)")
+        print("или импортируй старую папку MP_Data (collect_and_train.py import).")
         return
 
-    # Теперь создаем label_map ТОЛЬКО из тех жестов, для которых есть данные
-    label_map = {label:num for num, label in enumerate(valid_actions)}
-    
-    # Превращаем текстовые метки в числа на основе новой карты
-    numeric_labels = [label_map[label] for label in labels]
+    # Номер класса — место жеста в valid_actions, а не во всех 5 изначально заданных
+    source = SequenceSource([dataset.load(action) for action in valid_actions])
+    train_idx, val_idx, test_idx = split_indices(source.labels, val_split, test_split, seed)
 
-    print(f"\nДанные загружены. Найдено дублей: {len(sequences)}")
+    print(f"\nДанные загружены. Найдено дублей: {len(source)} (обучение {len(train_idx)}, "
+          f"валидация {len(val_idx)}, отложено {len(test_idx)})")
     print(f"Обучаемся на жестах: {valid_actions}")
-    
-    X = np.array(sequences)
-    y = to_categorical(numeric_labels).astype(int)
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.05)
 
     print("\n--- Сборка LSTM нейросети ---")
     model = Sequential()
-    model.add(LSTM(64, return_sequences=True, activation='relu', input_shape=(sequence_length, 126)))
+    model.add(Input(shape=(sequence_length, 126)))
+    model.add(LSTM(64, return_sequences=True, activation='relu'))
     model.add(LSTM(128, return_sequences=True, activation='relu'))
     model.add(LSTM(64, return_sequences=False, activation='relu'))
     model.add(Dense(64, activation='relu'))
@@ -159,11 +170,34 @@ def train_model():
 
     model.compile(optimizer='Adam', loss='categorical_crossentropy', metrics=['categorical_accuracy'])
 
-    print("\n--- Обучение модели ---")
-    model.fit(X_train, y_train, epochs=120, callbacks=[])
+    # Батчи читаются из memmap и аугментируются, пока считается прошлый шаг (tf.data prefetch)
+    train_data = make_tf_dataset(source, train_idx, len(valid_actions), batch_size, augment=augment, seed=seed)
+    steps_per_epoch = max(1, -(-len(train_idx) // batch_size))
+    monitor = 'val_loss' if len(val_idx) else 'loss'
+    validation_data = None
+    if len(val_idx):
+        X_val, y_val = source.take(val_idx)
+        validation_data = (X_val, np.eye(len(valid_actions), dtype=np.float32)[y_val])
+
+    # Останавливаемся, когда валидация перестала улучшаться, и возвращаем лучшие веса;
+    # лучшая эпоха заодно пишется на диск, чтобы прерванная задача не теряла результат
+    callbacks = [
+        EarlyStopping(monitor=monitor, patience=patience, restore_best_weights=True, verbose=1),
+        ModelCheckpoint(CHECKPOINT_PATH, monitor=monitor, save_best_only=True),
+    ]
+
+    print(f"\n--- Обучение модели (до {epochs} эпох, остановка после {patience} без улучшения {monitor}) ---")
+    model.fit(train_data, steps_per_epoch=steps_per_epoch, epochs=epochs, validation_data=validation_data, callbacks=callbacks)
 
     model_path = os.path.join(os.path.dirname(__file__), 'gesture_model.h5')
     model.save(model_path)
+    export_model(model, os.path.join(os.path.dirname(__file__), 'gesture_model.npz'))
+    if len(test_idx):
+        # Отложенные дубли сохраняем: на них quantize_model.py сравнивает уменьшенные варианты с исходной моделью
+        X_test, y_test = source.take(test_idx)
+        test_accuracy = float(np.mean(model.predict(X_test, verbose=0).argmax(axis=1) == y_test))
+        np.savez_compressed(HOLDOUT_PATH, X=X_test, y=y_test)
+        print(f"[+] Точность на отложенных дублях: {test_accuracy:.3f} ({len(test_idx)} шт.)")
     
     # СОХРАНЯЕМ СПИСОК ЖЕСТОВ ДЛЯ СЕРВЕРА
     classes_path = os.path.join(os.path.dirname(__file__), 'gesture_classes.txt')
@@ -172,17 +206,40 @@ def train_model():
         
     print(f"\n[+] Модель успешно обучена и сохранена: {model_path}")
 
-if __name__ == '__main__':
-    print("="*50)
-    print("🤖 АССИСТЕНТ ОБУЧЕНИЯ ЖЕСТОВ TENSORFLOW 🤖")
-    print("="*50)
-    print("1. Собрать данные камерой (Требуется вебка!)")
-    print("2. Обучить модель на собранных данных")
-    choice = input("\nВыберите действие (1 или 2): ")
-    if choice == '1':
+def main():
+    parser = argparse.ArgumentParser(description="Сбор жестов, обучение LSTM и экспорт модели для сервера")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('collect', help='собрать данные камерой (требуется вебка!)')
+    train = commands.add_parser('train', help='обучить модель на собранных данных')
+    train.add_argument('--epochs', type=int, default=300, help='максимум эпох (обычно раньше срабатывает остановка)')
+    train.add_argument('--patience', type=int, default=20, help='эпох без улучшения валидации до остановки')
+    train.add_argument('--batch-size', type=int, default=32)
+    train.add_argument('--val-split', type=float, default=0.1)
+    train.add_argument('--test-split', type=float, default=0.05, help='доля отложенных дублей (gesture_holdout.npz)')
+    train.add_argument('--no-augment', action='store_true', help='без шума, масштаба и искажения времени')
+    train.add_argument('--seed', type=int, default=0)
+    commands.add_parser('export', help='экспортировать gesture_model.h5 для сервера без TensorFlow')
+    commands.add_parser('import', help='импортировать старую папку MP_Data в упакованный датасет')
+    args = parser.parse_args()
+
+    if args.command == 'collect':
         print("\n=> Запуск камеры...")
         collect_data()
-    elif choice == '2':
-        train_model()
-    else:
-        print("Неверный выбор.")
+    elif args.command == 'train':
+        train_model(
+            epochs=args.epochs,
+            patience=args.patience,
+            batch_size=args.batch_size,
+            val_split=args.val_split,
+            test_split=args.test_split,
+            augment=not args.no_augment,
+            seed=args.seed,
+        )
+    elif args.command == 'export':
+        export_saved_model()
+    elif args.command == 'import':
+        imported = GestureDataset(DATASET_PATH, sequence_length=sequence_length).import_mp_data(DATA_PATH)
+        print(f"\n[+] Импортировано дублей: {imported or 'ничего (нет полных дублей)'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+
+# --- НАСТРОЙКИ СЕРВЕРА ---
+# Любое значение можно переопределить переменной окружения с тем же именем,
+# например: GESTURE_BATCH_MAX_SIZE=64 python main.py
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+# Общий планировщик инференса LSTM: окна от всех клиентов собираются в один батч
+GESTURE_BATCH_MAX_SIZE = _env_int("GESTURE_BATCH_MAX_SIZE", 32)  # Максимум окон в одном вызове модели
+GESTURE_BATCH_MAX_WAIT_MS = _env_float("GESTURE_BATCH_MAX_WAIT_MS", 5.0)  # Сколько ждем соседей по батчу
+
+# Бэкенд модели жестов: "numpy" (без TensorFlow), "keras" (.h5 через TensorFlow) или "auto"
+# (numpy, если рядом лежит экспортированный .npz, иначе keras)
+GESTURE_MODEL_BACKEND = os.environ.get("GESTURE_MODEL_BACKEND", "auto")
+GESTURE_MODEL_NUMPY_PATH = os.environ.get("GESTURE_MODEL_NUMPY_PATH", "gesture_model.npz")
+GESTURE_MODEL_KERAS_PATH = os.environ.get("GESTURE_MODEL_KERAS_PATH", "gesture_model.h5")
+
+# Пул процессов MediaPipe: по умолчанию один процесс на ядро
+TRACKER_WORKERS = _env_int("TRACKER_WORKERS", os.cpu_count() or 1)
+TRACKER_FRAME_BYTES = _env_int("TRACKER_FRAME_BYTES", 1280 * 720 * 3)  # Начальный размер shared memory на клиента
+TRACKER_TIMEOUT_S = _env_float("TRACKER_TIMEOUT_S", 5.0)
+TRACKER_MAX_SIDE = _env_int("TRACKER_MAX_SIDE", 640)  # Кадр уменьшается до этой длинной стороны сразу при декодировании (0 — не уменьшать)
+# Параметры mp.solutions.hands.Hands — 1 В 1 С ОБУЧЕНИЕМ (их же берет replay_session.py)
+TRACKER_HANDS_KWARGS = dict(
+    static_image_mode=False,
+    max_num_hands=2,
+    min_detection_confidence=0.5,
+    min_tracking_confidence=0.5,
+)
+
+# Допуск к MediaPipe: сессий трекера разом (0 — без ограничения), очередь ждущих и сколько в ней ждать.
+# Не дождался или очередь полна — соединение закрывается с кодом 1013 (Try Again Later)
+TRACKER_MAX_SESSIONS = _env_int("TRACKER_MAX_SESSIONS", TRACKER_WORKERS * 4)
+TRACKER_MAX_WAITING = _env_int("TRACKER_MAX_WAITING", 16)
+TRACKER_ADMISSION_TIMEOUT_S = _env_float("TRACKER_ADMISSION_TIMEOUT_S", 10.0)
+
+# Целевой FPS клиента по загрузке пула (сервер не обрабатывает кадры чаще) и сообщение
+# {"type": "flow_control", ...} для клиентов с ?flow_control=1
+FLOW_MIN_FPS = _env_float("FLOW_MIN_FPS", 2.0)
+FLOW_MAX_FPS = _env_float("FLOW_MAX_FPS", 30.0)
+FLOW_HEADROOM = _env_float("FLOW_HEADROOM", 0.8)  # Доля пропускной способности пула, которую раздаем клиентам
+FLOW_SATURATED_MAX_SIDE = _env_int("FLOW_SATURATED_MAX_SIDE", 320)  # Рекомендуемая сторона кадра, когда пул перегружен
+FLOW_UPDATE_EVERY_S = _env_float("FLOW_UPDATE_EVERY_S", 1.0)  # Как часто пересчитывать целевой FPS соединения
+
+# Обрезка кадра до рамки вокруг рук с прошлого кадра (при потере рук — полный кадр)
+HAND_ROI_ENABLED = os.environ.get("HAND_ROI_ENABLED", "0") == "1"
+HAND_ROI_PADDING = _env_float("HAND_ROI_PADDING", 0.5)  # Отступ вокруг рук в долях размера рамки рук
+
+# Точки рук с устройства: интервалы берутся по часам устройства, но если их время ушло от серверного
+# дальше этого порога или пошло назад — отсчет заново привязывается к серверу
+LANDMARK_MAX_CLOCK_DRIFT_S = _env_float("LANDMARK_MAX_CLOCK_DRIFT_S", 1.0)
+
+# Фильтр предиктов LSTM: не гоняем модель, когда ответ заранее известен
+GATE_MOTION_THRESHOLD = _env_float("GATE_MOTION_THRESHOLD", 0.002)  # Средний |Δ| окна с прошлого предикта (0 — выкл.)
+GATE_STRIDE = _env_int("GATE_STRIDE", 1)  # Предикт не чаще, чем раз в N кадров
+GATE_COOLDOWN_MOTION_THRESHOLD = _env_float("GATE_COOLDOWN_MOTION_THRESHOLD", 0.01)  # Движение, нужное для предикта во время кулдауна слова
+
+# Сигналинг WebRTC: очередь исходящих сообщений на пира и что делать с медленным пиром
+SIGNAL_QUEUE_SIZE = _env_int("SIGNAL_QUEUE_SIZE", 256)
+SIGNAL_SLOW_PEER_POLICY = os.environ.get("SIGNAL_SLOW_PEER_POLICY", "disconnect")  # "disconnect" или "drop"
+# Где живут комнаты: "memory" (один процесс) или "redis" (общие для всех воркеров/серверов)
+SIGNAL_BACKEND = os.environ.get("SIGNAL_BACKEND", "memory")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# Материалы комнат (лекции): materials/<room_id>/<файл>
+MATERIALS_DIR = os.environ.get("MATERIALS_DIR", "materials")
+MATERIALS_MAX_UPLOAD_BYTES = _env_int("MATERIALS_MAX_UPLOAD_MB", 200) * 1024 * 1024  # 0 — без ограничения
+MATERIALS_CHUNK_SIZE = _env_int("MATERIALS_CHUNK_SIZE", 1024 * 1024)  # Чанк копирования загрузки на диск
+MATERIALS_PAGE_MAX = _env_int("MATERIALS_PAGE_MAX", 500)  # Максимальный limit страницы списка материалов
+
+# Фоновая генерация лекций (/materials/generate)
+MATERIAL_JOB_WORKERS = _env_int("MATERIAL_JOB_WORKERS", 1)  # Сколько лекций генерируется одновременно
+MATERIAL_JOB_MAX_PENDING = _env_int("MATERIAL_JOB_MAX_PENDING", 64)  # Больше задач в очереди — 503
+MATERIAL_JOB_SYNC_WAIT_S = _env_float("MATERIAL_JOB_SYNC_WAIT_S", 2.0)  # Сколько generate ждет результата перед ответом
+
+# ?debug_stats=1 в /ws/hand_tracking: как часто (в кадрах) присылать клиенту времена этапов
+DEBUG_STATS_EVERY = _env_int("DEBUG_STATS_EVERY", 30)
+
+# Запись сырых кадров /ws/hand_tracking для replay_session.py (пусто — запись выключена).
+# Пишутся соединения с ?record=1, а при SESSION_RECORD_ALL=1 — все подряд.
+SESSION_RECORD_DIR = os.environ.get("SESSION_RECORD_DIR", "")
+SESSION_RECORD_ALL = os.environ.get("SESSION_RECORD_ALL", "0") == "1"
+SESSION_RECORD_MAX_BYTES = _env_int("SESSION_RECORD_MAX_MB", 1024) * 1024 * 1024  # На одну сессию, 0 — без ограничения
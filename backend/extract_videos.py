@@ -0,0 +1,138 @@
+"""Пакетное извлечение ключевых точек из записанных видео прямо в датасет жестов.
+
+Видео раскладываются по папкам жестов: <папка>/<жест>/*.mp4. Каждый файл
+обрабатывается в отдельном процессе со своим mp_hands.Hands, кадры приводятся
+к 30 FPS по своим временным меткам (как при записи с вебки) и режутся на окна
+по sequence_length кадров.
+
+    python extract_videos.py videos/ --workers 8 --stride 10
+"""
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from collect_and_train import DATASET_PATH, extract_keypoints, mp_hands, sequence_length
+from gesture_dataset import GestureDataset
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+TARGET_FPS = 30
+
+
+def extract_video(path, stride, mirror, min_hand_frames):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or TARGET_FPS
+    frame_ms = 1000.0 / fps
+    slot_ms = 1000.0 / TARGET_FPS
+    frames = []
+    # Кадр видео занимает отрезок [его время, время следующего) и идет в датасет столько раз,
+    # сколько в этот отрезок попало отметок k * 1000/30 мс: 60 FPS -> каждый второй кадр,
+    # 45 FPS -> два из трех, 25 FPS -> некоторые кадры дважды. Деление fps на 30 с округлением
+    # давало не 30 FPS (25 оставалось 25, 45 превращалось в 22.5)
+    next_slot = None
+    previous = None  # (время, кадр), ждущий времени следующего кадра
+    last_t = None
+    # Свой трекер на каждое видео: состояние трекинга не должно переходить между файлами
+    with mp_hands.Hands(min_detection_confidence=0.5, min_tracking_confidence=0.5, max_num_hands=2) as hands:
+
+        def take(frame_t, frame, until):
+            nonlocal next_slot
+            if next_slot is None:
+                next_slot = frame_t
+            count = 0
+            # Полмиллисекунды запаса: метки контейнера округлены, а 1000/30 — нет
+            while next_slot < until - 0.5:
+                next_slot += slot_ms
+                count += 1
+            if count:
+                if mirror:
+                    frame = cv2.flip(frame, 1)
+                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frames.extend([extract_keypoints(hands.process(image))] * count)
+
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            t = cap.get(cv2.CAP_PROP_POS_MSEC)
+            if last_t is not None and t <= last_t:
+                # Бэкенд не отдал метку (или она не растет): считаем по номинальному FPS
+                t = last_t + frame_ms
+            last_t = t
+            if previous is not None:
+                take(*previous, until=t)
+            previous = (t, frame)
+        if previous is not None:
+            take(*previous, until=previous[0] + frame_ms)
+    cap.release()
+
+    if len(frames) < sequence_length:
+        return np.zeros((0, sequence_length, 126), dtype=np.float32)
+    keypoints = np.asarray(frames, dtype=np.float32)
+    has_hands = keypoints.any(axis=1)
+    windows = [
+        keypoints[start:start + sequence_length]
+        for start in range(0, len(keypoints) - sequence_length + 1, stride)
+        # Окна, где руки почти не видны, только шумят в обучении
+        if has_hands[start:start + sequence_length].mean() >= min_hand_frames
+    ]
+    if not windows:
+        return np.zeros((0, sequence_length, 126), dtype=np.float32)
+    return np.stack(windows)
+
+
+def find_videos(root):
+    for action in sorted(os.listdir(root)):
+        action_dir = os.path.join(root, action)
+        if not os.path.isdir(action_dir):
+            continue
+        for name in sorted(os.listdir(action_dir)):
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                yield action, os.path.join(action_dir, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', help='папка с подпапками жестов')
+    parser.add_argument('--dataset', default=DATASET_PATH, help='куда дописывать дубли (по умолчанию backend/dataset)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--stride', type=int, default=10, help='шаг между началами окон, кадров')
+    parser.add_argument('--min-hand-frames', type=float, default=0.5, help='минимальная доля кадров окна с руками')
+    parser.add_argument('--mirror', action='store_true', help='зеркалить кадры (видео снято фронтальной камерой)')
+    args = parser.parse_args()
+
+    videos = list(find_videos(args.videos))
+    if not videos:
+        print(f"[!] В {args.videos} нет видео в подпапках жестов")
+        return
+
+    dataset = GestureDataset(args.dataset, sequence_length=sequence_length)
+    totals = {}
+    # spawn: у каждого процесса чистый MediaPipe без унаследованных потоков родителя
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+        futures = {
+            pool.submit(extract_video, path, args.stride, args.mirror, args.min_hand_frames): (action, path)
+            for action, path in videos
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            action, path = futures[future]
+            try:
+                windows = future.result()
+            except Exception as e:
+                print(f"[-] {path}: {e}")
+                continue
+            # Пишем только из главного процесса: манифест датасета не рассчитан на параллельную запись
+            if len(windows):
+                dataset.append(action, windows)
+            totals[action] = totals.get(action, 0) + len(windows)
+            print(f"[{done}/{len(videos)}] {action}: {os.path.basename(path)} -> {len(windows)} окон")
+
+    print(f"\n[+] Готово. Добавлено дублей: {totals}")
+
+
+if __name__ == '__main__':
+    main()
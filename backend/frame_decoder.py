@@ -0,0 +1,149 @@
+import cv2
+import numpy as np
+
+# Протокол кадра: 16 байт заголовка + данные изображения
+# [0] format_code, [1:5] ширина, [5:9] высота (uint32 LE), [9:13] поворот (int32 LE), [13:16] резерв
+HEADER_SIZE = 16
+
+FORMAT_NV21 = 0
+FORMAT_BGRA = 1
+FORMAT_RGBA = 2  # Из Flutter RepaintBoundary
+FORMAT_LANDMARKS = 16  # Не кадр, а готовые точки рук с устройства (см. parse_landmarks)
+FORMAT_NAMES = {FORMAT_NV21: "NV21", FORMAT_BGRA: "BGRA8888", FORMAT_RGBA: "RGBA8888", FORMAT_LANDMARKS: "landmarks"}  # Все остальное — JPEG/PNG
+
+# Сообщение с точками вместо кадра (трекинг на устройстве), тоже 16 байт заголовка:
+# [0] FORMAT_LANDMARKS, [1] флаги (бит 0 — float16, иначе float32), [2:8] резерв,
+# [8:16] float64 LE время снятия кадра на устройстве в секундах (любые часы, важны только разности),
+# затем 126 координат: 21 точка x, y, z левой руки, затем правой (нет руки — нули).
+# Точки — в системе кадра ПОСЛЕ поворота и зеркалирования, как их видит MediaPipe на сервере.
+LANDMARK_FLAG_FLOAT16 = 0x01
+LANDMARK_VALUES = 126
+
+
+def parse_frame_header(data):
+    format_code = data[0]
+    w = int.from_bytes(data[1:5], byteorder='little')
+    h = int.from_bytes(data[5:9], byteorder='little')
+    rotation = int.from_bytes(data[9:13], byteorder='little', signed=True)
+    return format_code, w, h, rotation
+
+
+def parse_landmarks(data):
+    """Возвращает (время на устройстве, 126 координат float32) или None, если сообщение битое."""
+    if len(data) < HEADER_SIZE:
+        return None
+    dtype = np.float16 if data[1] & LANDMARK_FLAG_FLOAT16 else np.float32
+    if len(data) != HEADER_SIZE + LANDMARK_VALUES * np.dtype(dtype).itemsize:
+        return None
+    timestamp = float(np.frombuffer(data, '<f8', count=1, offset=8)[0])
+    keypoints = np.frombuffer(data, np.dtype(dtype).newbyteorder('<'), offset=HEADER_SIZE).astype(np.float32)
+    if not (np.isfinite(timestamp) and np.isfinite(keypoints).all()):
+        return None
+    return timestamp, keypoints
+
+
+class LandmarkClock:
+    """Время точек с устройства -> время сервера для окна и кулдауна слов.
+
+    Интервалы между сообщениями берутся с устройства (сеть их не искажает), а отсчет —
+    серверный. Часам устройства не верим без границ: если отображенное время ушло от
+    серверного дальше max_drift (перевод часов, сон устройства) или пошло назад,
+    смещение заново привязывается к серверу. reanchored — было ли это на последнем map().
+    """
+
+    def __init__(self, max_drift=1.0):
+        self.max_drift = max_drift
+        self.offset = None
+        self.last = None
+        self.reanchored = False
+
+    def map(self, captured_at, server_now):
+        now = None if self.offset is None else captured_at + self.offset
+        self.reanchored = now is not None and (abs(now - server_now) > self.max_drift or now < self.last)
+        if now is None or self.reanchored:
+            now = server_now
+            self.offset = now - captured_at
+        self.last = now
+        return now
+
+
+class FrameDecoder:
+    """Декодер кадров одного соединения: RGB кадр в рабочем разрешении трекера.
+
+    Все промежуточные изображения живут в заранее выделенных буферах и
+    переиспользуются, пока размер кадра не меняется. Возвращаемый кадр — тоже
+    буфер декодера, он валиден только до следующего вызова decode().
+    """
+
+    def __init__(self, max_side=640):
+        self.max_side = max_side
+        self._buffers = {}
+
+    def _buffer(self, name, shape):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._buffers[name] = buf
+        return buf
+
+    def _working_size(self, w, h):
+        scale = min(1.0, self.max_side / max(w, h)) if self.max_side else 1.0
+        return max(1, round(w * scale)), max(1, round(h * scale))
+
+    def decode(self, data):
+        """Возвращает (RGB кадр, (format_code, w, h, rotation)) или (None, заголовок), если кадр битый."""
+        header = parse_frame_header(data)
+        format_code, w, h, rotation = header
+        # np.frombuffer со смещением не копирует данные (в отличие от data[16:])
+        payload = np.frombuffer(data, np.uint8, offset=HEADER_SIZE)
+
+        if format_code in (FORMAT_NV21, FORMAT_BGRA, FORMAT_RGBA):
+            if w <= 0 or h <= 0:
+                return None, header
+            expected_len = (h + h // 2) * w if format_code == FORMAT_NV21 else h * w * 4
+            if len(payload) != expected_len:
+                return None, header
+            rgb = self._decode_raw(format_code, payload, w, h)
+        else:
+            decoded = cv2.imdecode(payload, cv2.IMREAD_COLOR)
+            if decoded is None:
+                return None, header
+            rgb = self._to_working_rgb(decoded, cv2.COLOR_BGR2RGB)
+
+        return self._orient(rgb, rotation), header
+
+    def _decode_raw(self, format_code, payload, w, h):
+        if format_code == FORMAT_NV21:
+            # YUV нельзя честно уменьшить до конвертации, поэтому сначала цвет, потом размер
+            yuv = payload.reshape((h + h // 2, w))
+            return self._to_working_rgb(yuv, cv2.COLOR_YUV2RGB_NV21, color_shape=(h, w, 3))
+
+        tw, th = self._working_size(w, h)
+        code = cv2.COLOR_BGRA2RGB if format_code == FORMAT_BGRA else cv2.COLOR_RGBA2RGB
+        src = payload.reshape((h, w, 4))
+        if (tw, th) != (w, h):
+            # Уменьшаем 4-канальный кадр ДО конвертации: cvtColor работает уже с маленьким
+            src = cv2.resize(src, (tw, th), dst=self._buffer("small4", (th, tw, 4)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(src, code, dst=self._buffer("rgb", (th, tw, 3)))
+
+    def _to_working_rgb(self, src, code, color_shape=None):
+        h, w = color_shape[:2] if color_shape else src.shape[:2]
+        tw, th = self._working_size(w, h)
+        if (tw, th) == (w, h):
+            return cv2.cvtColor(src, code, dst=self._buffer("rgb", (h, w, 3)))
+        full = cv2.cvtColor(src, code, dst=self._buffer("full", (h, w, 3)))
+        return cv2.resize(full, (tw, th), dst=self._buffer("rgb", (th, tw, 3)), interpolation=cv2.INTER_AREA)
+
+    def _orient(self, img, rotation):
+        # Поворот (MediaPipe ждет вертикальный кадр) и зеркалирование как при обучении —
+        # одной операцией: rotate(90)+flip(1) == transpose, rotate(180)+flip(1) == flip(0),
+        # rotate(270)+flip(1) == transpose+flip(-1)
+        h, w = img.shape[:2]
+        if rotation == 90:
+            return cv2.transpose(img, dst=self._buffer("oriented_t", (w, h, 3)))
+        if rotation == 180:
+            return cv2.flip(img, 0, dst=self._buffer("oriented", (h, w, 3)))
+        if rotation == 270:
+            transposed = cv2.transpose(img, dst=self._buffer("transposed", (w, h, 3)))
+            return cv2.flip(transposed, -1, dst=self._buffer("oriented_t", (w, h, 3)))
+        return cv2.flip(img, 1, dst=self._buffer("oriented", (h, w, 3)))
@@ -0,0 +1,59 @@
+import asyncio
+
+from fastapi import WebSocketDisconnect
+
+# Почтовый ящик на один кадр для /ws/hand_tracking. Отдельная задача читает сокет
+# без остановки и кладет кадр в ящик, затирая еще не обработанный (это и есть
+# пропуск отставших кадров), а обработка всегда берет самый свежий. Прием следующего
+# кадра идет параллельно с MediaPipe/LSTM текущего, без wait_for с таймаутом 1 мс.
+
+
+class LatestFrameMailbox:
+    def __init__(self, on_drop=None):
+        self.dropped = 0
+        self.on_drop = on_drop
+        self._frame = None
+        self._event = asyncio.Event()
+        self._closed = False
+        self._error = None
+
+    def put(self, frame):
+        if self._frame is not None:
+            self.dropped += 1
+            if self.on_drop is not None:
+                self.on_drop()
+        self._frame = frame
+        self._event.set()
+
+    @property
+    def pending(self):
+        return self._frame is not None
+
+    def close(self, error=None):
+        self._closed = True
+        self._error = error
+        self._event.set()
+
+    async def get(self):
+        """Самый свежий кадр; ждет, если новых нет. После закрытия сокета — WebSocketDisconnect
+        (или ошибка чтения): отвечать на оставшийся кадр уже некому."""
+        while self._frame is None or self._closed:
+            if self._closed:
+                raise self._error if self._error is not None else WebSocketDisconnect()
+            self._event.clear()
+            await self._event.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+    async def pump(self, receive):
+        """Задача чтения: receive() -> put(), пока соединение не закроется."""
+        try:
+            while True:
+                self.put(await receive())
+        except WebSocketDisconnect:
+            self.close()
+        except asyncio.CancelledError:
+            self.close()
+            raise
+        except Exception as e:
+            self.close(e)
@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+
+#   dataset/manifest.json   — длина дубля, число признаков, {жест: {"file", "count"}} и уже импортированные дубли MP_Data
+#   dataset/action_<i>.f32  — все дубли жеста подряд, сырые float32 (count, sequence_length, features)
+# Дубли дописываются в конец файла, а читаются одним np.memmap без сотен open()/np.load.
+
+
+class GestureDataset:
+    def __init__(self, root, sequence_length=30, features=126):
+        self.root = root
+        self.sequence_length = sequence_length
+        self.features = features
+        self._manifest_path = os.path.join(root, 'manifest.json')
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+            if (self.manifest['sequence_length'], self.manifest['features']) != (sequence_length, features):
+                raise ValueError(
+                    f"Датасет {root} записан для окна {self.manifest['sequence_length']}x{self.manifest['features']}, "
+                    f"а ожидается {sequence_length}x{features}"
+                )
+        else:
+            self.manifest = {'sequence_length': sequence_length, 'features': features, 'dtype': 'float32', 'actions': {}}
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._manifest_path)
+
+    def actions(self):
+        return [action for action, entry in self.manifest['actions'].items() if entry['count'] > 0]
+
+    def count(self, action):
+        entry = self.manifest['actions'].get(action)
+        return entry['count'] if entry else 0
+
+    def append(self, action, sequences):
+        """Дописывает дубли формы (n, sequence_length, features) или один дубль (sequence_length, features)."""
+        sequences = np.asarray(sequences, dtype=np.float32)
+        if sequences.ndim == 2:
+            sequences = sequences[None]
+        if sequences.shape[1:] != (self.sequence_length, self.features):
+            raise ValueError(f"Ожидались дубли (*, {self.sequence_length}, {self.features}), получено {sequences.shape}")
+
+        entry = self.manifest['actions'].get(action)
+        if entry is None:
+            entry = {'file': f"action_{len(self.manifest['actions'])}.f32", 'count': 0}
+            self.manifest['actions'][action] = entry
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, entry['file'])
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            # Пишем строго после последнего учтенного дубля: хвост от прерванной записи затирается
+            f.seek(entry['count'] * self.sequence_length * self.features * 4)
+            f.write(np.ascontiguousarray(sequences).tobytes())
+            f.truncate()
+        entry['count'] += len(sequences)
+        self._save_manifest()
+
+    def load(self, action):
+        """Все дубли жеста как np.memmap (count, sequence_length, features), только чтение."""
+        count = self.count(action)
+        if count == 0:
+            return np.zeros((0, self.sequence_length, self.features), dtype=np.float32)
+        path = os.path.join(self.root, self.manifest['actions'][action]['file'])
+        return np.memmap(path, dtype=np.float32, mode='r', shape=(count, self.sequence_length, self.features))
+
+    def import_mp_data(self, mp_data_path, actions=None):
+        """Переносит старое дерево MP_Data/<жест>/<дубль>/<кадр>.npy. Неполные дубли пропускаются,
+        уже импортированные (список "imported" в манифесте) — тоже: повторный импорт ничего не дублирует."""
+        imported = {}
+        if not os.path.isdir(mp_data_path):
+            return imported
+        source = os.path.basename(os.path.normpath(mp_data_path))
+        done = set(self.manifest.setdefault('imported', []))
+        for action in actions if actions is not None else sorted(os.listdir(mp_data_path)):
+            action_dir = os.path.join(mp_data_path, action)
+            if not os.path.isdir(action_dir):
+                continue
+            windows, keys = [], []
+            sequence_dirs = sorted((d for d in os.listdir(action_dir) if d.isdigit()), key=int)
+            for sequence in sequence_dirs:
+                key = f"{source}/{action}/{sequence}"
+                if key in done:
+                    continue
+                paths = [os.path.join(action_dir, sequence, f"{frame_num}.npy") for frame_num in range(self.sequence_length)]
+                if all(os.path.exists(p) for p in paths):
+                    windows.append(np.stack([np.load(p) for p in paths]))
+                    keys.append(key)
+            if windows:
+                # Отметки пишутся в манифест вместе с новым count (append сохраняет манифест)
+                self.manifest['imported'].extend(keys)
+                self.append(action, np.stack(windows))
+                imported[action] = len(windows)
+        return imported
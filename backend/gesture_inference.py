@@ -0,0 +1,93 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import REGISTRY
+
+BATCH_SECONDS = REGISTRY.histogram("gesture_lstm_batch_seconds", "Время одного вызова LSTM на батче окон")
+BATCH_SIZE = REGISTRY.histogram(
+    "gesture_lstm_batch_size", "Окон в одном вызове LSTM", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+class GestureInferenceScheduler:
+    """Общий для всех соединений планировщик предиктов LSTM.
+
+    Каждый клиент отдает готовое окно (30, 126) и ждет результат, а сам вызов
+    модели выполняется одним батчем на отдельном потоке: окна копятся не дольше
+    max_wait_ms или пока не наберется max_batch_size.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        # Один поток: модель не любит параллельные вызовы, а батч и так собирает всех
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gesture-lstm")
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def predict(self, window):
+        """Возвращает вероятности классов для одного окна жеста."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((np.asarray(window, dtype=np.float32), future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    # Время вышло, но забираем то, что уже лежит в очереди
+                    while len(batch) < self.max_batch_size and not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Клиент мог отключиться, пока окно ждало батча
+            batch = [(window, future) for window, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            windows = np.stack([window for window, _ in batch])
+            started = time.perf_counter()
+            try:
+                predictions = await loop.run_in_executor(self._executor, self._predict_sync, windows)
+                BATCH_SECONDS.observe(time.perf_counter() - started)
+                BATCH_SIZE.observe(len(batch))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+
+    def _predict_sync(self, windows):
+        return np.asarray(self.model.predict(windows, verbose=0))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,100 @@
+import numpy as np
+
+from sequence_buffer import KeypointRingBuffer
+
+
+def keypoints_from_hands(hands):
+    # Тот же порядок, что extract_keypoints() при обучении: 63 координаты левой руки, затем правой
+    lh = np.zeros(21*3, dtype=np.float32)
+    rh = np.zeros(21*3, dtype=np.float32)
+    for handedness, landmarks in hands:
+        # Координаты X берем сырыми, потому что кадр УЖЕ перевернут при декодировании!
+        res = np.asarray(landmarks, dtype=np.float32).reshape(-1)
+        if handedness == 'Left':
+            lh = res
+        else:
+            rh = res
+    return np.concatenate([lh, rh])
+
+
+def hands_from_keypoints(keypoints):
+    # Обратно к [(handedness, (21, 3))] для ответа клиенту; пустой блок (нули) — руки нет
+    hands = []
+    for handedness, block in (('Left', keypoints[:63]), ('Right', keypoints[63:])):
+        if np.any(block):
+            hands.append((handedness, block.reshape(21, 3)))
+    return hands
+
+
+class GestureRecognizer:
+    """Окно LSTM одного клиента: компенсация FPS, предикт, порог уверенности и кулдаун слова."""
+
+    def __init__(self, scheduler, actions, gate=None, window=30, confidence=0.70, cooldown=2.0):
+        self.scheduler = scheduler
+        self.actions = actions
+        self.gate = gate
+        self.confidence = confidence
+        self.cooldown = cooldown
+        self.sequence = KeypointRingBuffer(length=window, size=126)
+        self.subtitle = ""
+        self.last_gesture = ""
+        self.last_gesture_time = 0
+        self.last_frame_time = 0  # Для адаптивной компенсации FPS
+        self.last_prediction = None  # Вероятности последнего предикта: их повторяет пропущенный фильтром кадр
+
+    async def update(self, keypoints, now):
+        """Добавляет кадр (126 координат) со временем now в секундах, возвращает текущий субтитр."""
+        # --- АДАПТИВНАЯ ЧАСТОТА КАДРОВ ДЛЯ LSTM ---
+        # Чтобы модель не "замедлялась", если телефон завис или сеть тормозит,
+        # заполняем буфер так, будто кадры идут ровно в 30 FPS (~33ms).
+        if self.last_frame_time == 0:
+            delta_t = 0.033
+        else:
+            delta_t = now - self.last_frame_time
+        self.last_frame_time = now
+
+        frames_to_add = max(1, int(delta_t / 0.0333))
+        frames_to_add = min(frames_to_add, self.sequence.length)  # Максимум 30 кадров (1 сек тишины)
+
+        # Кольцевой буфер хранит только последние 30 (окно в ~1 сек)
+        self.sequence.push(keypoints, repeat=frames_to_add)
+
+        if not self.sequence.is_full or self.scheduler is None:
+            return self.subtitle
+
+        # Если в ТЕКУЩЕМ кадре есть руки (чтобы не распознавать пустоту поверх старого буфера)
+        if np.sum(keypoints) <= 0:
+            self.subtitle = ""  # Сброс, если рук нет в кадре
+            self.last_prediction = None
+            if self.gate is not None:
+                self.gate.reset()
+            return self.subtitle
+
+        in_cooldown = bool(self.last_gesture) and (now - self.last_gesture_time) < self.cooldown
+        if self.gate is not None and self.last_prediction is not None and not self.gate.should_predict(self.sequence.view(), in_cooldown):
+            # Окно почти не изменилось: модель ответила бы то же, что в прошлый раз. Берем прошлые
+            # вероятности и прогоняем через те же порог и кулдаун — фильтр экономит только вычисления
+            res_pred = self.last_prediction
+        else:
+            try:
+                # Предикт уходит в общий батч со всеми клиентами и не блокирует event loop
+                res_pred = await self.scheduler.predict(self.sequence.view())
+            except Exception:
+                return self.subtitle
+            self.last_prediction = res_pred
+        best_idx = np.argmax(res_pred)
+
+        # Если нейронка уверена более чем на 70% (понижено для отзывчивости)
+        if res_pred[best_idx] > self.confidence:
+            word = str(self.actions[best_idx])
+            # Кулдаун: чтобы не спамило одно и то же слово кучу раз подряд,
+            # если это то же самое слово, ждем 2 секунды.
+            if word == self.last_gesture and (now - self.last_gesture_time) < self.cooldown:
+                self.subtitle = ""
+            else:
+                self.subtitle = word
+                self.last_gesture = word
+                self.last_gesture_time = now
+        else:
+            self.subtitle = ""  # Сброс, если жест непонятен
+        return self.subtitle
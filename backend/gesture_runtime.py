@@ -0,0 +1,143 @@
+import json
+import os
+
+import numpy as np
+
+# Формат .npz: массивы "<номер слоя>/<имя веса>" + JSON-описание слоев в ключе "spec".
+# Пишется из collect_and_train.export_model(), читается без TensorFlow.
+# Уменьшенные варианты (quantize_model.py) лежат рядом: gesture_model.float16.npz — веса
+# в float16, gesture_model.int8.npz — матрицы в int8 с масштабом на выходной столбец
+# ("<имя>.scale"), смещения в float32. Это только размер файла для скачивания: при загрузке
+# все разворачивается обратно в float32, потому что float16/int8 умножения в NumPy идут мимо
+# BLAS и в десятки раз медленнее. Сервер всегда берет исходный float32 .npz.
+
+MODEL_VARIANTS = ("float32", "float16", "int8")
+SCALE_SUFFIX = ".scale"
+
+
+def _relu(x):
+    return np.maximum(x, 0.0)
+
+
+def _sigmoid(x):
+    # Через tanh, чтобы не ловить переполнение exp на больших отрицательных входах
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    "relu": _relu,
+    "tanh": np.tanh,
+    "sigmoid": _sigmoid,
+    "softmax": _softmax,
+    "linear": lambda x: x,
+}
+
+
+class NumpyGestureModel:
+    """Инференс Sequential LSTM/Dense модели на чистом NumPy (та же математика, что в Keras)."""
+
+    def __init__(self, spec, weights):
+        self.spec = spec
+        self.weights = weights
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            spec = json.loads(str(data["spec"]))
+            weights = {}
+            for key in data.files:
+                if key == "spec" or key.endswith(SCALE_SUFFIX):
+                    continue
+                weight = data[key]
+                if weight.dtype == np.int8:
+                    weight = dequantize_int8(weight, data[key + SCALE_SUFFIX])
+                weights[key] = weight.astype(np.float32)
+        return cls(spec, weights)
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        for i, layer in enumerate(self.spec):
+            if layer["type"] == "lstm":
+                x = self._lstm(x, i, layer)
+            elif layer["type"] == "dense":
+                x = ACTIVATIONS[layer["activation"]](x @ self.weights[f"{i}/kernel"] + self.weights[f"{i}/bias"])
+            else:
+                raise ValueError(f"Неизвестный тип слоя: {layer['type']}")
+        return x
+
+    def _lstm(self, x, i, layer):
+        kernel = self.weights[f"{i}/kernel"]
+        recurrent_kernel = self.weights[f"{i}/recurrent_kernel"]
+        units = recurrent_kernel.shape[0]
+        activation = ACTIVATIONS[layer["activation"]]
+        recurrent_activation = ACTIVATIONS[layer["recurrent_activation"]]
+
+        batch, steps, _ = x.shape
+        # Входную проекцию считаем сразу для всех шагов одним матричным умножением
+        projected = x @ kernel + self.weights[f"{i}/bias"]
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        outputs = np.empty((batch, steps, units), dtype=np.float32) if layer["return_sequences"] else None
+
+        for t in range(steps):
+            z = projected[:, t] + h @ recurrent_kernel
+            # Порядок гейтов как в Keras: input, forget, cell, output
+            gate_i = recurrent_activation(z[:, :units])
+            gate_f = recurrent_activation(z[:, units:2 * units])
+            gate_c = activation(z[:, 2 * units:3 * units])
+            gate_o = recurrent_activation(z[:, 3 * units:])
+            c = gate_f * c + gate_i * gate_c
+            h = gate_o * activation(c)
+            if outputs is not None:
+                outputs[:, t] = h
+
+        return outputs if outputs is not None else h
+
+
+def quantize_int8(weight):
+    """Симметричное int8 с масштабом на выходной столбец (последняя ось): (int8 веса, масштабы float32)."""
+    scale = np.abs(weight).max(axis=0) / 127.0
+    scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+    return np.clip(np.round(weight / scale), -127, 127).astype(np.int8), scale
+
+
+def dequantize_int8(weight, scale):
+    return weight.astype(np.float32) * scale
+
+
+def variant_path(numpy_path, variant):
+    """gesture_model.npz + "int8" -> gesture_model.int8.npz (float32 — сам исходный файл)."""
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Неизвестный вариант модели жестов: {variant}")
+    if variant == "float32":
+        return numpy_path
+    stem, ext = os.path.splitext(numpy_path)
+    return f"{stem}.{variant}{ext}"
+
+
+def load_gesture_model(backend, numpy_path, keras_path):
+    """Возвращает (model, backend). У модели есть predict(batch, verbose=0) в обоих вариантах."""
+    if backend == "auto":
+        backend = "numpy" if os.path.exists(numpy_path) else "keras"
+
+    if backend == "numpy":
+        return NumpyGestureModel.load(numpy_path), backend
+    if backend == "keras":
+        # TensorFlow импортируем только если его явно выбрали: он стоит секунды старта и сотни МБ памяти
+        os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+        from tensorflow.keras.models import load_model
+        return load_model(keras_path), backend
+    raise ValueError(f"Неизвестный бэкенд модели жестов: {backend}")
+
+
+def load_gesture_classes(path):
+    """Классы, на которых модель была обучена (по строке на класс), или None, если файла нет."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return np.array([line.strip() for line in f if line.strip()])
@@ -0,0 +1,100 @@
+import numpy as np
+
+# Потоковая подача дублей в model.fit вместо одного np.array на весь датасет.
+# Дубли остаются в np.memmap из GestureDataset, в память попадает только текущий батч
+# (выборка строк по индексам), аугментация считается на весь батч сразу без циклов по дублям.
+# Окно — (sequence_length, 126): 21 точка x/y/z левой руки, затем правой; рука, которой
+# не было в кадре, — нули, и после аугментации она остается нулями.
+
+HANDS, LANDMARKS, COORDS = 2, 21, 3
+
+
+def split_indices(labels, val_fraction, test_fraction, seed=0):
+    """Стратифицированное разбиение номеров дублей: (train, val, test). В val/test попадает
+    хотя бы по одному дублю жеста, если их у жеста больше одного."""
+    rng = np.random.default_rng(seed)
+    train, val, test = [], [], []
+    for label in np.unique(labels):
+        idx = rng.permutation(np.flatnonzero(labels == label))
+        n_test = int(round(len(idx) * test_fraction)) or int(test_fraction > 0 and len(idx) > 2)
+        n_val = int(round(len(idx) * val_fraction)) or int(val_fraction > 0 and len(idx) > 1)
+        test.append(idx[:n_test])
+        val.append(idx[n_test:n_test + n_val])
+        train.append(idx[n_test + n_val:])
+    return tuple(np.sort(np.concatenate(part)).astype(np.int64) for part in (train, val, test))
+
+
+class SequenceSource:
+    """Все дубли датасета как один список: номер дубля -> (memmap жеста, строка)."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays  # [memmap (count, T, F)] по номеру класса
+        self.labels = np.concatenate([np.full(len(a), i, dtype=np.int64) for i, a in enumerate(arrays)])
+        self.rows = np.concatenate([np.arange(len(a), dtype=np.int64) for a in arrays])
+
+    def __len__(self):
+        return len(self.labels)
+
+    def take(self, indices):
+        """Дубли по номерам одним массивом float32 (B, T, F) и их метки."""
+        labels = self.labels[indices]
+        batch = np.empty((len(indices),) + self.arrays[0].shape[1:], dtype=np.float32)
+        for label in np.unique(labels):
+            positions = np.flatnonzero(labels == label)
+            rows = self.rows[indices[positions]]
+            # memmap читаем по возрастанию строк и раскладываем по местам в батче
+            order = np.argsort(rows)
+            batch[positions[order]] = self.arrays[label][rows[order]]
+        return batch, labels
+
+
+def augment_batch(batch, rng, jitter=0.003, scale=0.1, time_warp=0.2):
+    """Аугментация батча (B, T, 126): шум точек, масштаб руки вокруг ее центра, неравномерное время."""
+    b, t, _ = batch.shape
+    x = batch.reshape(b, t, HANDS, LANDMARKS, COORDS)
+    present = np.any(x != 0, axis=(3, 4), keepdims=True)  # Рука есть в кадре
+
+    if scale:
+        # Один масштаб на дубль и руку: жест тот же, рука ближе/дальше от камеры
+        center = x.mean(axis=3, keepdims=True)
+        factor = rng.uniform(1 - scale, 1 + scale, size=(b, 1, HANDS, 1, 1)).astype(np.float32)
+        x = center + (x - center) * factor
+    if jitter:
+        x = x + rng.normal(0, jitter, size=x.shape).astype(np.float32)
+    x = np.where(present, x, 0).astype(np.float32)
+
+    if time_warp:
+        # Монотонная случайная сетка времени: участки жеста быстрее или медленнее, концы на месте
+        steps = rng.uniform(1 - time_warp, 1 + time_warp, size=(b, t - 1))
+        grid = np.concatenate([np.zeros((b, 1)), np.cumsum(steps, axis=1)], axis=1)
+        grid = np.rint(grid / grid[:, -1:] * (t - 1)).astype(np.int64)
+        x = x[np.arange(b)[:, None], grid]
+    return x.reshape(b, t, -1)
+
+
+def batch_generator(source, indices, num_classes, batch_size, augment=True, seed=0):
+    """Бесконечный генератор батчей (X, one-hot y) для одной эпохи за другой, каждая в новом порядке."""
+    rng = np.random.default_rng(seed)
+    eye = np.eye(num_classes, dtype=np.float32)
+    while True:
+        order = rng.permutation(indices)
+        for start in range(0, len(order), batch_size):
+            batch, labels = source.take(order[start:start + batch_size])
+            if augment:
+                batch = augment_batch(batch, rng)
+            yield batch, eye[labels]
+
+
+def make_tf_dataset(source, indices, num_classes, batch_size, augment=True, seed=0):
+    """tf.data поверх batch_generator с prefetch: следующий батч готовится, пока шаг обучения считается."""
+    import tensorflow as tf
+
+    shape = source.arrays[0].shape[1:]
+    dataset = tf.data.Dataset.from_generator(
+        lambda: batch_generator(source, indices, num_classes, batch_size, augment, seed),
+        output_signature=(
+            tf.TensorSpec(shape=(None,) + shape, dtype=tf.float32),
+            tf.TensorSpec(shape=(None, num_classes), dtype=tf.float32),
+        ),
+    )
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+
+class HandRoiCropper:
+    """Обрезает кадр до рамки вокруг рук с прошлого кадра.
+
+    Пока руки видны, MediaPipe получает только участок кадра с отступом вокруг них,
+    а найденные точки переводятся обратно в координаты полного кадра. Рамка
+    переставляется, только когда руки подходят к ее краю: так трекер видит
+    стабильную картинку между кадрами. Потеряли руки — следующий кадр идет целиком.
+
+    Кадр на вход — в полном разрешении (FrameDecoder(max_side=0)): рамка вырезается из
+    него, и до рабочего размера трекера max_side уменьшается уже только вырезанный
+    участок. Иначе рука в рамке была бы не детальнее, чем в уменьшенном полном кадре.
+    """
+
+    def __init__(self, padding=0.5, min_size=0.25, edge_margin=0.1, max_side=640):
+        self.padding = padding          # Отступ вокруг рук в долях размера рамки рук
+        self.min_size = min_size        # Минимальный размер рамки в долях кадра
+        self.edge_margin = edge_margin  # Насколько близко к краю рамки руки могут подойти до перестановки
+        self.max_side = max_side        # Рабочее разрешение трекера по большей стороне (0 — без уменьшения)
+        self.roi = None                 # (x0, y0, x1, y1) в нормированных координатах полного кадра
+        self._buffer = None
+
+    def crop(self, image):
+        """Возвращает (изображение для трекера, roi). roi=None означает полный кадр.
+
+        Изображение — буфер обрезчика, валиден только до следующего вызова crop()."""
+        if self.roi is None:
+            return self._to_working_size(image), None
+        h, w = image.shape[:2]
+        x0, y0, x1, y1 = self.roi
+        px0, py0 = int(x0 * w), int(y0 * h)
+        px1, py1 = max(px0 + 1, int(np.ceil(x1 * w))), max(py0 + 1, int(np.ceil(y1 * h)))
+        # Возвращаем точные границы в пикселях, чтобы перевод координат совпал с обрезкой
+        roi = (px0 / w, py0 / h, px1 / w, py1 / h)
+        return self._to_working_size(image[py0:py1, px0:px1]), roi
+
+    def _to_working_size(self, image):
+        # Нормированные координаты от масштаба не зависят, поэтому to_full_frame это не трогает
+        h, w = image.shape[:2]
+        scale = min(1.0, self.max_side / max(w, h)) if self.max_side else 1.0
+        if scale == 1.0:
+            return image
+        tw, th = max(1, round(w * scale)), max(1, round(h * scale))
+        if self._buffer is None or self._buffer.shape != (th, tw, 3):
+            self._buffer = np.empty((th, tw, 3), dtype=np.uint8)
+        return cv2.resize(image, (tw, th), dst=self._buffer, interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def to_full_frame(hands, roi):
+        if roi is None:
+            return hands
+        x0, y0, x1, y1 = roi
+        scale = np.array([x1 - x0, y1 - y0, x1 - x0], dtype=np.float32)
+        offset = np.array([x0, y0, 0.0], dtype=np.float32)
+        # z у MediaPipe в масштабе ширины изображения, поэтому масштабируем как x
+        return [(handedness, landmarks * scale + offset) for handedness, landmarks in hands]
+
+    def update(self, hands):
+        if not hands:
+            self.roi = None
+            return
+
+        points = np.concatenate([landmarks[:, :2] for _, landmarks in hands])
+        (hx0, hy0), (hx1, hy1) = points.min(axis=0), points.max(axis=0)
+
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            mx, my = (x1 - x0) * self.edge_margin, (y1 - y0) * self.edge_margin
+            if hx0 >= x0 + mx and hy0 >= y0 + my and hx1 <= x1 - mx and hy1 <= y1 - my:
+                return  # Руки спокойно внутри рамки — не трогаем ее
+
+        cx, cy = (hx0 + hx1) / 2, (hy0 + hy1) / 2
+        half_w = max((hx1 - hx0) * (1 + 2 * self.padding), self.min_size) / 2
+        half_h = max((hy1 - hy0) * (1 + 2 * self.padding), self.min_size) / 2
+        roi = (max(0.0, cx - half_w), max(0.0, cy - half_h), min(1.0, cx + half_w), min(1.0, cy + half_h))
+
+        # Если рамка почти весь кадр — обрезка ничего не дает
+        if (roi[2] - roi[0]) * (roi[3] - roi[1]) > 0.8:
+            self.roi = None
+        else:
+            self.roi = tuple(float(v) for v in roi)
@@ -0,0 +1,50 @@
+import numpy as np
+
+# Общие счетчики по всем соединениям процесса (для логов и метрик)
+GATE_TOTALS = {"predicted": 0, "skipped_motion": 0, "skipped_stride": 0, "skipped_cooldown": 0}
+
+
+class InferenceGate:
+    """Решает, стоит ли гонять LSTM на текущем окне.
+
+    - motion_threshold: средний |Δ| координат окна с момента прошлого предикта. Если руки
+      почти не двигались, модель выдаст то же самое — пропускаем.
+    - stride: предикт не чаще, чем раз в stride кадров.
+    - cooldown_motion_threshold: пока действует кулдаун только что показанного слова,
+      предикт запускаем лишь при заметном движении (новый жест), а не на дрожании рук.
+    """
+
+    def __init__(self, motion_threshold=0.002, stride=1, cooldown_motion_threshold=0.01):
+        self.motion_threshold = motion_threshold
+        self.stride = max(1, stride)
+        self.cooldown_motion_threshold = cooldown_motion_threshold
+        self.stats = dict.fromkeys(GATE_TOTALS, 0)
+        self._last_window = None
+        self._frames_since_predict = 0
+
+    def _skip(self, reason):
+        self.stats[reason] += 1
+        GATE_TOTALS[reason] += 1
+        return False
+
+    def should_predict(self, window, in_cooldown):
+        self._frames_since_predict += 1
+        if self._frames_since_predict < self.stride:
+            return self._skip("skipped_stride")
+
+        if self._last_window is not None:
+            motion = float(np.mean(np.abs(window - self._last_window)))
+            if motion < self.motion_threshold:
+                return self._skip("skipped_motion")
+            if in_cooldown and motion < self.cooldown_motion_threshold:
+                return self._skip("skipped_cooldown")
+
+        self.stats["predicted"] += 1
+        GATE_TOTALS["predicted"] += 1
+        self._frames_since_predict = 0
+        self._last_window = np.array(window, copy=True)
+        return True
+
+    def reset(self):
+        # Руки пропали: следующее появление рук всегда проверяем моделью
+        self._last_window = None
@@ -0,0 +1,87 @@
+import json
+import struct
+
+import numpy as np
+
+# Ответы /ws/hand_tracking. По умолчанию JSON {"type": "hands_data", ...}, а клиент может
+# при подключении запросить бинарный формат: /ws/hand_tracking?format=binary[&dtype=float16]
+#
+# Бинарное сообщение (little-endian), заголовок ровно 8 байт:
+#   [0]    тип сообщения (1 = hands_data)
+#   [1]    флаги: бит 0 — координаты во float16 (иначе float32)
+#   [2]    количество рук n (не больше 16)
+#   [3]    резерв (0)
+#   [4:6]  uint16 индекс субтитра в списке "subtitles" из приветствия (0xFFFF — субтитра нет)
+#   [6:8]  uint16 руки: бит i — рука i (0 = Left, 1 = Right)
+#   [8:]   n * 21 * 3 координат x, y, z (x уже отзеркален, как в JSON)
+# Координаты всегда начинаются со смещения 8 (BINARY_DATA_OFFSET, оно же "data_offset" в
+# приветствии): клиент смотрит на них без копирования (Float32List.view / np.frombuffer).
+
+MSG_HANDS_DATA = 1
+FLAG_FLOAT16 = 0x01
+NO_SUBTITLE = 0xFFFF
+MAX_BINARY_HANDS = 16
+BINARY_HEADER = struct.Struct('<BBBxHH')
+BINARY_DATA_OFFSET = BINARY_HEADER.size
+
+
+def _mirrored(hands):
+    # ЗЕРКАЛИРУЕМ X, потому что камера во Flutter зеркальная.
+    # Это вернет геометрию в нормальный "реальный" мир.
+    for handedness, landmarks in hands:
+        out = landmarks.copy()
+        out[:, 0] = 1.0 - out[:, 0]
+        yield handedness, out
+
+
+class JsonHandsEncoder:
+    binary = False
+
+    def hello(self):
+        return None
+
+    def encode(self, hands, subtitle):
+        return json.dumps({
+            "type": "hands_data",
+            "hands": [
+                [{"x": x, "y": y, "z": z} for x, y, z in landmarks.tolist()]
+                for _, landmarks in _mirrored(hands)
+            ],
+            "subtitle": subtitle,
+        }, ensure_ascii=False, separators=(",", ":"))
+
+
+class BinaryHandsEncoder:
+    binary = True
+
+    def __init__(self, subtitles, dtype="float32"):
+        self.subtitles = [str(s) for s in subtitles]
+        self._subtitle_ids = {s: i for i, s in enumerate(self.subtitles)}
+        self.dtype = np.float16 if dtype == "float16" else np.float32
+        self._flags = FLAG_FLOAT16 if self.dtype == np.float16 else 0
+
+    def hello(self):
+        # Один раз при подключении (текстом): клиент узнает формат и таблицу субтитров
+        return {
+            "type": "hands_format",
+            "format": "binary",
+            "dtype": np.dtype(self.dtype).name,
+            "data_offset": BINARY_DATA_OFFSET,
+            "subtitles": self.subtitles,
+        }
+
+    def encode(self, hands, subtitle):
+        subtitle_id = self._subtitle_ids.get(subtitle, NO_SUBTITLE) if subtitle else NO_SUBTITLE
+        hands = hands[:MAX_BINARY_HANDS]
+        handedness = sum(1 << i for i, (label, _) in enumerate(hands) if label != 'Left')
+        header = BINARY_HEADER.pack(MSG_HANDS_DATA, self._flags, len(hands), subtitle_id, handedness)
+        if not hands:
+            return header
+        coords = np.stack([landmarks for _, landmarks in _mirrored(hands)]).astype(self.dtype, copy=False)
+        return header + coords.tobytes()
+
+
+def make_hands_encoder(query_params, subtitles):
+    if query_params.get("format") == "binary":
+        return BinaryHandsEncoder(subtitles, dtype=query_params.get("dtype", "float32"))
+    return JsonHandsEncoder()
@@ -2,38 +2,78 @@ import asyncio
 import base64
 import json
 import logging
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel
 
 import uvicorn
-import cv2
 import numpy as np
-import mediapipe as mp
-from concurrent.futures import ThreadPoolExecutor
 import time
 import math
 import os
+import socket
+import uuid
+from typing import Dict, Optional
+
+import config
+from admission import ADMISSION_TOTALS, TrackerAdmission
+from gesture_inference import GestureInferenceScheduler
+from gesture_runtime import load_gesture_classes, load_gesture_model
+from tracker_pool import HandTrackerPool, TrackerBusy
+from frame_decoder import FORMAT_LANDMARKS, FrameDecoder, HEADER_SIZE, LandmarkClock, parse_landmarks
+from frame_mailbox import LatestFrameMailbox
+from hand_roi import HandRoiCropper
+from gesture_recognizer import GestureRecognizer, hands_from_keypoints, keypoints_from_hands
+from inference_gate import GATE_TOTALS, InferenceGate
+from metrics import REGISTRY, StageStats
+from signaling import SIGNAL_TOTALS, SLOW_PEER_DROP, PeerConnection, make_local_delivery, relay
+from room_bus import make_room_bus
+from landmark_codec import make_hands_encoder
+from session_recorder import SessionRecorder
+from materials import (
+    MaterialsIndex, MultipartFileReader, check_content_length, file_response, list_etag, not_modified, room_dir,
+    safe_filename, save_stream,
+)
+from material_jobs import JOB_DONE, JOB_FAILED, JobQueueFull, MaterialJobQueue
 
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-try:
-    from tensorflow.keras.models import load_model
-    gesture_model = load_model('gesture_model.h5')
-    
-    # Читаем реальные классы, на которых модель была обучена
-    classes_path = 'gesture_classes.txt'
-    if os.path.exists(classes_path):
-        with open(classes_path, 'r', encoding='utf-8') as f:
-            gesture_actions = np.array([line.strip() for line in f if line.strip()])
-    else:
-        # Если вдруг файла нет, падаем на запасной вариант
-        gesture_actions = np.array(['Привет'])
-        print("[-] gesture_classes.txt не найден! Субтитры могут быть неверными.")
-        
-    print(f"[+] Модель TensorFlow загружена! Жесты: {gesture_actions.tolist()}")
-except Exception as e:
-    gesture_model = None
-    gesture_actions = []
-    print(f"[-] Модель TensorFlow не найдена (распознавание отключено): {e}")
+# Модель, планировщик, шина комнат и очередь генерации создаются в startup, а не при импорте:
+# spawn-процессы MediaPipe (и uvicorn.run("main:app") под python main.py) импортируют main заново,
+# и каждый из них загружал бы свою модель (с keras — TensorFlow) и свои потоки
+gesture_model = None
+gesture_actions = []
+# Один планировщик на весь процесс: окна всех клиентов идут в модель общим батчем
+gesture_scheduler = None
+
+
+def load_gesture_runtime():
+    global gesture_model, gesture_actions, gesture_scheduler
+    try:
+        gesture_model, gesture_backend = load_gesture_model(
+            config.GESTURE_MODEL_BACKEND,
+            config.GESTURE_MODEL_NUMPY_PATH,
+            config.GESTURE_MODEL_KERAS_PATH,
+        )
+
+        # Читаем реальные классы, на которых модель была обучена
+        gesture_actions = load_gesture_classes('gesture_classes.txt')
+        if gesture_actions is None:
+            # Если вдруг файла нет, падаем на запасной вариант
+            gesture_actions = np.array(['Привет'])
+            print("[-] gesture_classes.txt не найден! Субтитры могут быть неверными.")
+
+        print(f"[+] Модель жестов загружена ({gesture_backend})! Жесты: {gesture_actions.tolist()}")
+    except Exception as e:
+        gesture_model = None
+        gesture_actions = []
+        print(f"[-] Модель жестов не найдена (распознавание отключено): {e}")
+
+    if gesture_model is not None:
+        gesture_scheduler = GestureInferenceScheduler(
+            gesture_model,
+            max_batch_size=config.GESTURE_BATCH_MAX_SIZE,
+            max_wait_ms=config.GESTURE_BATCH_MAX_WAIT_MS,
+        )
 
 app = FastAPI()
 
@@ -47,332 +87,527 @@ app.add_middleware(
 
 
 
-# Для обработки тяжелой нейросети без блокировки асинхронного FastAPI
-executor = ThreadPoolExecutor(max_workers=4)
+# MediaPipe крутится в отдельных процессах (без GIL), клиент закреплен за своим процессом.
+# Настройки Hands 1 в 1 с обучением — в config.TRACKER_HANDS_KWARGS
+tracker_pool = HandTrackerPool(
+    num_workers=config.TRACKER_WORKERS,
+    frame_bytes=config.TRACKER_FRAME_BYTES,
+    hands_kwargs=config.TRACKER_HANDS_KWARGS,
+    timeout=config.TRACKER_TIMEOUT_S,
+)
+# Сколько клиентов трекаются разом, очередь за местом и целевой FPS каждого по загрузке пула
+tracker_admission = TrackerAdmission(
+    max_active=config.TRACKER_MAX_SESSIONS,
+    max_waiting=config.TRACKER_MAX_WAITING,
+    wait_timeout=config.TRACKER_ADMISSION_TIMEOUT_S,
+    workers=config.TRACKER_WORKERS,
+    min_fps=config.FLOW_MIN_FPS,
+    max_fps=config.FLOW_MAX_FPS,
+    headroom=config.FLOW_HEADROOM,
+)
 
 logger = logging.getLogger("api")
 
+@app.on_event("startup")
+async def start_gesture_runtime():
+    load_gesture_runtime()
+
+@app.on_event("startup")
+async def start_tracker_pool():
+    # Запускаем здесь, а не при импорте: spawn-процессы сами импортируют main
+    tracker_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_gesture_scheduler():
+    if gesture_scheduler is not None:
+        await gesture_scheduler.close()
+    tracker_pool.shutdown()
+
 @app.get("/")
 def read_root():
     return {"status": "NeuroERP Backend is running", "message": "Connection OK"}
 
+# Подписчики /ws на прогресс генерации материалов: room_id -> {client_id: PeerConnection}
+material_job_listeners: Dict[str, Dict[str, PeerConnection]] = {}
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    # Все ответы идут через очередь: уведомления о задачах генерации приходят из других задач
+    peer = PeerConnection(str(uuid.uuid4()), websocket, queue_size=config.SIGNAL_QUEUE_SIZE, slow_peer_policy=SLOW_PEER_DROP)
+    peer.start()
+    subscriptions = set()
     print("Client connected to general WS")
     try:
         while True:
             data = await websocket.receive_text()
             print(f"Received msg: {data}")
             if data == "ping":
-                await websocket.send_text("pong")
+                peer.enqueue("pong")
+                continue
+            try:
+                msg = json.loads(data)
+            except json.JSONDecodeError:
+                msg = None
+            if isinstance(msg, dict) and msg.get("type") == "subscribe_material_jobs" and msg.get("room_id"):
+                # {"type": "subscribe_material_jobs", "room_id": "1"} -> сообщения {"type": "material_job", ...}
+                room_id = str(msg["room_id"])
+                material_job_listeners.setdefault(room_id, {})[peer.client_id] = peer
+                subscriptions.add(room_id)
+                for job in material_jobs.jobs.values():
+                    if job.room_id == room_id and not job.done.is_set():
+                        peer.enqueue(json.dumps({"type": "material_job", **job.to_dict()}))
+            elif isinstance(msg, dict) and msg.get("type") == "unsubscribe_material_jobs":
+                room_id = str(msg.get("room_id"))
+                material_job_listeners.get(room_id, {}).pop(peer.client_id, None)
+                subscriptions.discard(room_id)
             else:
-                await websocket.send_text(f"Echo: {data}")
+                peer.enqueue(f"Echo: {data}")
     except WebSocketDisconnect:
         print("Client disconnected from general WS")
+    finally:
+        for room_id in subscriptions:
+            listeners = material_job_listeners.get(room_id, {})
+            listeners.pop(peer.client_id, None)
+            if not listeners:
+                material_job_listeners.pop(room_id, None)
+        await peer.stop()
+
+# --- МЕТРИКИ (/metrics, формат Prometheus) ---
+# Этапы кадра (от выемки из ящика): decode (разбор + cvtColor/поворот/зеркало), track (весь вызов пула, с IPC),
+# mediapipe (чистый hands.process в воркере), predict (LSTM с ожиданием батча),
+# encode, send и frame (от получения кадра до отправки ответа)
+STAGE_SECONDS = REGISTRY.histogram("hand_tracking_stage_seconds", "Время этапа обработки кадра", ("stage",))
+FRAMES = REGISTRY.counter(
+    "hand_tracking_frames_total",
+    "Кадры /ws/hand_tracking: processed, dropped (вытеснены более свежим), invalid, error",
+    ("result",),
+)
+LANDMARK_MESSAGES = REGISTRY.counter("hand_tracking_landmark_messages_total", "Сообщения с готовыми точками рук (трекинг на устройстве)")
+LANDMARK_CLOCK_REANCHORS = REGISTRY.counter("hand_tracking_landmark_clock_reanchors_total", "Перепривязки часов устройства к серверу (уход больше LANDMARK_MAX_CLOCK_DRIFT_S или назад)")
+ACTIVE_CONNECTIONS = REGISTRY.gauge("hand_tracking_connections", "Открытые соединения /ws/hand_tracking")
+ACTIVE_CONNECTIONS.set(0)
+REGISTRY.counter("hand_tracking_admission_total", "Допуск к MediaPipe: admitted, queued, rejected, timed_out", ("decision",), collect=lambda: ADMISSION_TOTALS)
+REGISTRY.gauge("hand_tracking_tracker_sessions", "Клиенты с местом в пуле MediaPipe", collect=lambda: {(): tracker_admission.active})
+REGISTRY.gauge("hand_tracking_admission_waiting", "Клиенты в очереди за местом в пуле MediaPipe", collect=lambda: {(): tracker_admission.waiting})
+REGISTRY.gauge("hand_tracking_target_fps", "Целевой FPS клиента при текущей загрузке пула", collect=lambda: {(): tracker_admission.target_fps()})
+REGISTRY.counter("gesture_gate_decisions_total", "Решения фильтра предиктов LSTM", ("decision",), collect=lambda: GATE_TOTALS)
+REGISTRY.counter("signaling_messages_dropped_total", "Сообщения сигналинга, не влезшие в очередь пира", collect=lambda: {(): SIGNAL_TOTALS["dropped"]})
+REGISTRY.counter("signaling_slow_peer_disconnects_total", "Пиры, отключенные за медленное чтение", collect=lambda: {(): SIGNAL_TOTALS["slow_disconnects"]})
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+async def admit_tracker(reader):
+    # Ждем места в пуле, но не дольше, чем клиент остается на связи (reader завершается при отключении)
+    acquire = asyncio.ensure_future(tracker_admission.acquire())
+    await asyncio.wait({acquire, reader}, return_when=asyncio.FIRST_COMPLETED)
+    if not acquire.done():
+        acquire.cancel()
+        await asyncio.gather(acquire, return_exceptions=True)
+        return False
+    return acquire.result()
+
+def flow_control_message():
+    saturated = tracker_admission.saturated()
+    return {
+        "type": "flow_control",
+        "target_fps": round(tracker_admission.target_fps(), 1),
+        # Больше рабочего разрешения слать незачем: сервер все равно уменьшит
+        "max_side": config.FLOW_SATURATED_MAX_SIDE if saturated else config.TRACKER_MAX_SIDE,
+        "saturated": saturated,
+    }
 
 @app.websocket("/ws/hand_tracking")
 async def hand_tracking_endpoint(websocket: WebSocket):
     await websocket.accept()
+    hands_encoder = make_hands_encoder(websocket.query_params, gesture_actions)
+    if hands_encoder.hello() is not None:
+        await websocket.send_json(hands_encoder.hello())
     
-    # 1 В 1 НАСТРОЙКИ С ОБУЧЕНИЕМ: 
-    # Каждый пользователь получает СВОЮ изолированную "камеру" MediaPipe
-    client_hands = mp.solutions.hands.Hands(
-        static_image_mode=False,
-        max_num_hands=2,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    )
-    
-    def process_image_sync(image):
-        return client_hands.process(image)
+    # Каждый пользователь получает СВОЮ изолированную "камеру" MediaPipe в одном из процессов пула —
+    # с первым кадром: клиенту, который сам шлет точки рук (FORMAT_LANDMARKS), трекер не нужен
+    tracker_session = None
+    landmark_clock = LandmarkClock(max_drift=config.LANDMARK_MAX_CLOCK_DRIFT_S)  # Для точек с устройства
+    # С обрезкой по рукам декодер отдает полный кадр: до рабочего размера уменьшается уже вырезанная рамка
+    roi_cropper = HandRoiCropper(padding=config.HAND_ROI_PADDING, max_side=config.TRACKER_MAX_SIDE) if config.HAND_ROI_ENABLED else None
+    frame_decoder = FrameDecoder(max_side=0 if roi_cropper is not None else config.TRACKER_MAX_SIDE)
     print("Client connected for Hand Tracking")
 
     clench_start_time = 0
     was_fist = False
     
-    # LSTM Буфер
-    sequence = []
-    current_subtitle = ""
-    last_gesture = ""
-    last_gesture_time = 0
-    last_frame_time = 0 # Для адаптивной компенсации FPS
+    # LSTM Буфер (окно из 30 последних кадров), кулдаун слов и фильтр лишних предиктов
+    gate = InferenceGate(
+        motion_threshold=config.GATE_MOTION_THRESHOLD,
+        stride=config.GATE_STRIDE,
+        cooldown_motion_threshold=config.GATE_COOLDOWN_MOTION_THRESHOLD,
+    )
+    recognizer = GestureRecognizer(gesture_scheduler, gesture_actions, gate=gate)
+
+    # ?debug_stats=1 — раз в DEBUG_STATS_EVERY кадров клиент получает {"type": "debug_stats", ...}
+    stats = StageStats(STAGE_SECONDS)
+    debug_stats = websocket.query_params.get("debug_stats") == "1"
+    frames_processed = 0
+    ACTIVE_CONNECTIONS.inc(1)
+
+    # ?flow_control=1 — клиент получает {"type": "flow_control", ...} при допуске и при смене нагрузки.
+    # Чаще целевого FPS кадры не обрабатываются в любом случае: лишние вытесняются в ящике
+    flow_control = websocket.query_params.get("flow_control") == "1"
+    last_flow = None
+    frame_interval = 0.0
+    next_frame_at = 0.0
+    flow_checked_at = 0.0
+
+    # Читаем сокет в отдельной задаче: в ящике всегда лежит только самый свежий кадр
+    mailbox = LatestFrameMailbox(on_drop=lambda: FRAMES.inc(1, "dropped"))
+    receive = websocket.receive_bytes
+    # Запись сырых кадров (до пропуска отставших) для replay_session.py
+    recorder = None
+    if config.SESSION_RECORD_DIR and (config.SESSION_RECORD_ALL or websocket.query_params.get("record") == "1"):
+        recorder = SessionRecorder.create(
+            config.SESSION_RECORD_DIR,
+            meta={"query": dict(websocket.query_params)},
+            max_bytes=config.SESSION_RECORD_MAX_BYTES,
+        )
+        receive = recorder.wrap(receive)
+        print(f"[+] Запись сессии: {recorder.path}")
+    reader = asyncio.create_task(mailbox.pump(receive))
 
     try:
         while True:
-            # Читаем кадр (будет ждать, пока не придет хоть один)
-            data = await websocket.receive_bytes()
-            
-            # --- ВАЖНО: АГРЕССИВНЫЙ ПРОПУСК КАДРОВ ДЛЯ УСТРАНЕНИЯ ОТСТАВАНИЯ ---
-            # Вычищаем очередь (если вдруг накопилась) и берем только самый свежий (последний) кадр.
-            try:
-                while True:
-                    next_data = await asyncio.wait_for(websocket.receive_bytes(), timeout=0.001)
-                    data = next_data
-            except asyncio.TimeoutError:
-                pass
+            if tracker_session is not None:
+                delay = next_frame_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # Ждем кадр; все, что пришло, пока обрабатывался прошлый, уже вытеснено последним
+            data = await mailbox.get()
+            frame_start = time.perf_counter()
             
-            if len(data) < 16:
+            if len(data) < HEADER_SIZE:
+                FRAMES.inc(1, "invalid")
                 continue
 
-            # Парсим заголовок (16 байт)
-            format_code = data[0]
-            w = int.from_bytes(data[1:5], byteorder='little')
-            h = int.from_bytes(data[5:9], byteorder='little')
-            rotation = int.from_bytes(data[9:13], byteorder='little', signed=True)
-            # УБРАН 📋 [СЕРВЕР] Заголовок
-
-            img_data = data[16:]
-            img = None
-
-            try:
-                if format_code == 0: # NV21
-                    if w > 0 and h > 0:
-                        nparr = np.frombuffer(img_data, np.uint8).reshape((h + h // 2, w))
-                        img = cv2.cvtColor(nparr, cv2.COLOR_YUV2BGR_NV21)
-                elif format_code == 1: # BGRA8888
-                    if w > 0 and h > 0:
-                        nparr = np.frombuffer(img_data, np.uint8).reshape((h, w, 4))
-                        img = cv2.cvtColor(nparr, cv2.COLOR_BGRA2BGR)
-                elif format_code == 2: # RGBA8888 (Из Flutter RepaintBoundary)
-                    if w > 0 and h > 0:
-                        nparr = np.frombuffer(img_data, np.uint8)
-                        expected_len = h * w * 4
-                        if len(nparr) == expected_len:
-                            nparr = nparr.reshape((h, w, 4))
-                            # Сразу конвертируем во внутренний формат RGB, который нужен MediaPipe
-                            img = cv2.cvtColor(nparr, cv2.COLOR_RGBA2RGB)
-                        else:
-                            continue
-                else:
-                    nparr = np.frombuffer(img_data, np.uint8)
-                    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-                if img is None:
+            if data[0] == FORMAT_LANDMARKS:
+                # Трекинг уже сделан на устройстве: сразу в окно LSTM, без декодирования и MediaPipe
+                parsed = parse_landmarks(data)
+                if parsed is None:
+                    FRAMES.inc(1, "invalid")
                     continue
-
-                # Rotate image if rotation is provided (MediaPipe expects upright images)
-                if rotation == 90:
-                    img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-                elif rotation == 180:
-                    img = cv2.rotate(img, cv2.ROTATE_180)
-                elif rotation == 270:
-                    img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
-
-                # Изображение УЖЕ в RGB после декодирования RGBA2RGB
-                img_rgb = img
-                
-                # Зеркалируем кадр, чтобы вернуть его в нормальный (незеркальный) вид веб-камеры, 
-                # КАК БЫЛО ПРИ ОБУЧЕНИИ СЕТИ! Это починит путаницу левой/правой руки!
-                img_rgb = cv2.flip(img_rgb, 1)
-                
-                # Запускаем MediaPipe в пуле потоков, чтобы он НЕ блочил asyncio event loop!
-                loop = asyncio.get_event_loop()
-                results = await loop.run_in_executor(executor, process_image_sync, img_rgb)
-            except Exception as e:
-                # Оставляем критическую ошибку, чтобы знать если конвейер упал
-                print(f"🚨 [СЕРВЕР] Ошибка обработки кадра (OpenCV -> MediaPipe): {e}")
-                continue
-
-            hand_landmarks_list = []
-            if results.multi_hand_landmarks:
-                # print(f"✋ [СЕРВЕР] Найдено рук: {len(results.multi_hand_landmarks)}") # Removed per instruction
-                for idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
-                    landmarks = []
-                    for lm in hand_landmarks.landmark:
-                        landmarks.append({
-                            # ЗЕРКАЛИРУЕМ X, потому что камера во Flutter зеркальная.
-                            # Это вернет геометрию в нормальный "реальный" мир.
-                            "x": 1.0 - lm.x,
-                            "y": lm.y,
-                            "z": lm.z
-                        })
-                    hand_landmarks_list.append(landmarks)
-            # else:
-                # print("🔍 [СЕРВЕР] Руки не найдены в этом кадре.") # Removed per instruction
+                captured_at, keypoints = parsed
+                now = landmark_clock.map(captured_at, time.time())
+                if landmark_clock.reanchored:
+                    LANDMARK_CLOCK_REANCHORS.inc(1)
+                hands = hands_from_keypoints(keypoints)
+                tracked = time.perf_counter()
+                stats.observe("decode", tracked - frame_start)
+                LANDMARK_MESSAGES.inc(1)
+            else:
+                if tracker_session is None:
+                    # Первый кадр: место в пуле MediaPipe, при перегрузке — очередь или отказ
+                    if not await admit_tracker(reader):
+                        if not reader.done():
+                            print(f"[-] Hand Tracking: пул MediaPipe занят ({tracker_admission.active} сессий, "
+                                  f"{tracker_admission.waiting} в очереди), отказ клиенту")
+                            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="server busy, retry later")
+                        break
+                    try:
+                        tracker_session = tracker_pool.open_session()
+                    except Exception:
+                        # Место допущено, но сессии нет: finally его не вернет, отдаем сразу
+                        tracker_admission.release()
+                        raise
+                    flow_checked_at = 0.0
+                try:
+                    # Декодирование, уменьшение до рабочего разрешения, поворот и зеркалирование
+                    # (КАК БЫЛО ПРИ ОБУЧЕНИИ СЕТИ!) в переиспользуемых буферах соединения
+                    img_rgb, _ = frame_decoder.decode(data)
+                    if img_rgb is None:
+                        FRAMES.inc(1, "invalid")
+                        continue
+                    decoded = time.perf_counter()
+                    stats.observe("decode", decoded - frame_start)
+
+                    # Запускаем MediaPipe в процессе клиента, чтобы он НЕ блочил asyncio event loop!
+                    if roi_cropper is not None:
+                        # Трекер видит только участок вокруг рук с прошлого кадра, точки возвращаем в полный кадр
+                        crop, roi = roi_cropper.crop(img_rgb)
+                        hands = roi_cropper.to_full_frame(await tracker_pool.process(tracker_session, crop), roi)
+                        roi_cropper.update(hands)
+                    else:
+                        hands = await tracker_pool.process(tracker_session, img_rgb)
+                    tracked = time.perf_counter()
+                    stats.observe("track", tracked - decoded)
+                    stats.observe("mediapipe", tracker_session.last_process_s)
+                    tracker_admission.observe(tracker_session.last_process_s)
+                    keypoints = keypoints_from_hands(hands)
+                except TrackerBusy:
+                    # Воркер еще читает прошлый кадр клиента (завис после таймаута): этот пропускаем
+                    FRAMES.inc(1, "dropped")
+                    continue
+                except Exception as e:
+                    # Оставляем критическую ошибку, чтобы знать если конвейер упал
+                    print(f"🚨 [СЕРВЕР] Ошибка обработки кадра (OpenCV -> MediaPipe): {e}")
+                    FRAMES.inc(1, "error")
+                    continue
+                now = time.time()
 
             # Virtual elements logic
             # (Удалено по запросу пользователя)
 
             # --- ИНТЕГРАЦИЯ НЕЙРОСЕТИ (LSTM) ---
-            lh = np.zeros(21*3)
-            rh = np.zeros(21*3)
-            if results.multi_hand_landmarks:
-                for idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
-                    handedness = results.multi_handedness[idx].classification[0].label
-                    # Координаты X берем сырыми, потому что мы УЖЕ перевернули картинку выше!
-                    res = np.array([[lm.x, lm.y, lm.z] for lm in hand_landmarks.landmark]).flatten()
-                    if handedness == 'Left':
-                        lh = res
-                    else:
-                        rh = res
-            keypoints = np.concatenate([lh, rh])
-            
-            # --- АДАПТИВНАЯ ЧАСТОТА КАДРОВ ДЛЯ LSTM ---
-            # Чтобы модель не "замедлялась", если телефон завис или сеть тормозит,
-            # заполняем буфер так, будто кадры идут ровно в 30 FPS (~33ms).
-            now = time.time()
-            if last_frame_time == 0:
-                delta_t = 0.033
+            current_subtitle = await recognizer.update(keypoints, now)
+            predicted = time.perf_counter()
+            stats.observe("predict", predicted - tracked)
+
+            # JSON по умолчанию или компактный бинарный формат, если клиент попросил его при подключении
+            payload = hands_encoder.encode(hands, current_subtitle)
+            encoded = time.perf_counter()
+            stats.observe("encode", encoded - predicted)
+            if hands_encoder.binary:
+                await websocket.send_bytes(payload)
             else:
-                delta_t = now - last_frame_time
-            last_frame_time = now
-            
-            frames_to_add = max(1, int(delta_t / 0.0333))
-            frames_to_add = min(frames_to_add, 30) # Максимум 30 кадров (1 сек тишины)
-            
-            for _ in range(frames_to_add):
-                sequence.append(keypoints)
-                
-            sequence = sequence[-30:] # Храним только последние 30 (окно в ~1 сек)
-            
-            if len(sequence) == 30 and gesture_model is not None:
-                # Если в ТЕКУЩЕМ кадре есть руки (чтобы не распознавать пустоту поверх старого буфера)
-                if np.sum(keypoints) > 0:
-                    try:
-                        # Делаем быстрый предикт прямо тут. Для батча = 1 он мгновенный
-                        res_pred = gesture_model.predict(np.expand_dims(sequence, axis=0), verbose=0)[0]
-                        best_idx = np.argmax(res_pred)
-                        
-                        # Если нейронка уверена более чем на 70% (понижено для отзывчивости)
-                        if res_pred[best_idx] > 0.70: 
-                            word = str(gesture_actions[best_idx])
-                            now = time.time()
-                            # Кулдаун: чтобы не спамило одно и то же слово кучу раз подряд,
-                            # если это то же самое слово, ждем 2 секунды.
-                            if word == last_gesture and (now - last_gesture_time) < 2.0:
-                                current_subtitle = ""
-                            else:
-                                current_subtitle = word
-                                last_gesture = word
-                                last_gesture_time = now
-                        else:
-                            current_subtitle = "" # Сброс, если жест непонятен
-                    except Exception as e:
-                        pass
-                else:
-                    current_subtitle = "" # Сброс, если рук нет в кадре
-
-            await websocket.send_json({
-                "type": "hands_data",
-                "hands": hand_landmarks_list,
-                "subtitle": current_subtitle
-            })
+                await websocket.send_text(payload)
+            sent = time.perf_counter()
+            stats.observe("send", sent - encoded)
+            stats.observe("frame", sent - frame_start)
+            FRAMES.inc(1, "processed")
+            frames_processed += 1
+
+            if tracker_session is not None:
+                if sent - flow_checked_at >= config.FLOW_UPDATE_EVERY_S:
+                    flow_checked_at = sent
+                    frame_interval = 1.0 / tracker_admission.target_fps()
+                    if flow_control:
+                        message = flow_control_message()
+                        if message != last_flow:
+                            await websocket.send_json(message)
+                            last_flow = message
+                next_frame_at = frame_start + frame_interval
+
+            if debug_stats and frames_processed % config.DEBUG_STATS_EVERY == 0:
+                await websocket.send_json({
+                    "type": "debug_stats",
+                    "frames": frames_processed,
+                    "dropped": mailbox.dropped,
+                    "stages": stats.snapshot(),
+                    "gate": gate.stats,
+                    "target_fps": round(1.0 / frame_interval, 1) if frame_interval else None,
+                })
 
     except WebSocketDisconnect:
         pass
     except Exception as e:
         print(f"🚨 [СЕРВЕР] Глобальная ошибка вебсокета Hand Tracking: {e}")
     finally:
-        client_hands.close()
-
-import uuid
-from typing import Dict, Any
-
-# In-memory dictionary to store Websocket connections for WebRTC signaling
-# rooms[room_id][client_id] = WebSocket
-rooms: Dict[str, Dict[str, WebSocket]] = {}
+        reader.cancel()
+        ACTIVE_CONNECTIONS.inc(-1)
+        if tracker_session is not None:
+            tracker_pool.close_session(tracker_session)
+            tracker_admission.release()
+        if recorder is not None:
+            recorder.close(wait=False)
+            print(f"[+] Сессия записана: {recorder.path} ({recorder.frames} кадров, не успели записать: {recorder.dropped})")
+        print(f"Client disconnected from Hand Tracking. Кадров: {frames_processed}, пропущено: {mailbox.dropped}. Предикты LSTM: {gate.stats}")
+
+# Peers connected to THIS worker: rooms[room_id][client_id] = PeerConnection
+# (WebSocket + bounded outbound queue). Room membership across workers and message
+# routing between them live in room_bus (in-memory or Redis, see SIGNAL_BACKEND).
+rooms: Dict[str, Dict[str, PeerConnection]] = {}
+room_bus = None  # Created on startup: spawn workers re-import main and must not build their own
+
+@app.on_event("startup")
+async def start_room_bus():
+    global room_bus
+    room_bus = make_room_bus(config.SIGNAL_BACKEND, make_local_delivery(rooms), redis_url=config.REDIS_URL)
+    await room_bus.start()
+
+@app.on_event("shutdown")
+async def close_room_bus():
+    if room_bus is not None:
+        await room_bus.close()
 
 @app.websocket("/ws/signal/{room_id}")
 async def signaling_endpoint(websocket: WebSocket, room_id: str):
     await websocket.accept()
-    if room_id not in rooms:
-        rooms[room_id] = {}
-        
     client_id = str(uuid.uuid4())
-    rooms[room_id][client_id] = websocket
-    print(f"[WS] + User {client_id} CONNECTED to room {room_id}. Total users in room: {len(rooms[room_id])}")
-    
-    # Send the user their ID and the list of others
-    other_peers = [pid for pid in rooms[room_id].keys() if pid != client_id]
-    await websocket.send_json({"type": "room_state", "my_id": client_id, "peers": other_peers})
-    
-    # Notify others that this peer joined
-    for pid, client_ws in list(rooms[room_id].items()):
-        if pid != client_id:
-            await client_ws.send_json({"type": "peer_joined", "peer_id": client_id})
-    
+    peer = PeerConnection(
+        client_id,
+        websocket,
+        queue_size=config.SIGNAL_QUEUE_SIZE,
+        slow_peer_policy=config.SIGNAL_SLOW_PEER_POLICY,
+    )
+    peer.start()
+    rooms.setdefault(room_id, {})[client_id] = peer
+    joined = False
+
     try:
+        other_peers = await room_bus.join(room_id, client_id)
+        joined = True
+        print(f"[WS] + User {client_id} CONNECTED to room {room_id}. Total users in room: {len(other_peers) + 1}")
+
+        # Send the user their ID and the list of others
+        peer.enqueue(json.dumps({"type": "room_state", "my_id": client_id, "peers": other_peers}))
+        
+        # Notify others that this peer joined
+        await room_bus.publish(room_id, json.dumps({"type": "peer_joined", "peer_id": client_id}), exclude=client_id)
+
         while True:
             data = await websocket.receive_text()
             try:
-                msg = json.loads(data)
-                target_id = msg.get("to")
-                # Ensure the message has a "from" assigned by the server for security
-                msg["from"] = client_id
-                
-                # Targeted sending
-                if target_id and target_id in rooms[room_id]:
-                    await rooms[room_id][target_id].send_text(json.dumps(msg))
-                else:
-                    # Generic broadcast
-                    for pid, client_ws in list(rooms[room_id].items()):
-                        if pid != client_id:
-                            await client_ws.send_text(json.dumps(msg))
-            except json.JSONDecodeError:
+                await relay(room_bus, room_id, client_id, json.loads(data))
+            except (json.JSONDecodeError, AttributeError):
                 pass
     except WebSocketDisconnect:
-        if client_id in rooms.get(room_id, {}):
-            del rooms[room_id][client_id]
-        if not rooms[room_id]:
-            del rooms[room_id]
-        else:
-            for pid, client_ws in list(rooms[room_id].items()):
-                try:
-                    await client_ws.send_json({"type": "peer_left", "peer_id": client_id})
-                except:
-                    pass
-        print(f"[WS] - User {client_id} DISCONNECTED from room {room_id}. Remaining: {len(rooms.get(room_id, {}))}")
+        print(f"[WS] - User {client_id} DISCONNECTED from room {room_id}.")
     except Exception as e:
         print(f"[WS] ! ERROR in room {room_id}: {str(e)}")
-        if room_id in rooms and client_id in rooms[room_id]:
-            del rooms[room_id][client_id]
+        if not joined:
+            # The room bus is unavailable (e.g. Redis is down): let the client retry later
+            try:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            except Exception:
+                pass
+    finally:
+        await peer.stop()
+        room = rooms.get(room_id, {})
+        if room.get(client_id) is peer:
+            del room[client_id]
+        if not room:
+            rooms.pop(room_id, None)
+        if joined:
+            try:
+                await room_bus.leave(room_id, client_id)
+                await room_bus.publish(room_id, json.dumps({"type": "peer_left", "peer_id": client_id}))
+            except Exception as e:
+                print(f"[WS] ! Could not leave room {room_id} for {client_id}: {str(e)}")
+
+# Кэш списков материалов: опрос списка всем классом не ходит в listdir на каждый запрос
+materials_index = MaterialsIndex()
+
+def publish_material_job(job):
+    if job.status == JOB_DONE and job.done.is_set():
+        materials_index.record(job.materials_dir, job.filename, job.size, job.sha256)
+    listeners = material_job_listeners.get(job.room_id)
+    if listeners:
+        text = json.dumps({"type": "material_job", **job.to_dict()})
+        for peer in list(listeners.values()):
+            peer.enqueue(text)
+
+material_jobs = None  # Создается в startup: потоки генерации не нужны процессам MediaPipe
+
+@app.on_event("startup")
+async def start_material_jobs():
+    global material_jobs
+    material_jobs = MaterialJobQueue(
+        max_workers=config.MATERIAL_JOB_WORKERS,
+        max_pending=config.MATERIAL_JOB_MAX_PENDING,
+        on_update=publish_material_job,
+    )
 
-import socket
-import os
-import shutil
-from fastapi import File, UploadFile, Form, HTTPException
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+@app.on_event("shutdown")
+async def close_material_jobs():
+    if material_jobs is not None:
+        await material_jobs.close()
 
 class MaterialGenRequest(BaseModel):
     title: str
     description: str
 
 @app.post("/api/rooms/{room_id}/materials/upload")
-async def upload_material(room_id: str, file: UploadFile = File(...)):
-    room_dir = os.path.join("materials", room_id)
-    os.makedirs(room_dir, exist_ok=True)
-    file_path = os.path.join(room_dir, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    return {"status": "success", "filename": file.filename}
+async def upload_material(room_id: str, request: Request):
+    # multipart-поле "file"; тело разбираем сами по мере приема, чтобы отказать по
+    # Content-Length до приема файла и оборвать прием сразу за лимитом
+    check_content_length(request.headers, config.MATERIALS_MAX_UPLOAD_BYTES)
+    upload = MultipartFileReader(request.headers, request.stream(), "file", max_bytes=config.MATERIALS_MAX_UPLOAD_BYTES)
+    filename = safe_filename(await upload.open())
+    materials_dir = room_dir(config.MATERIALS_DIR, room_id)
+    size, sha256 = await save_stream(
+        upload.file_chunks(),
+        materials_dir,
+        filename,
+        max_bytes=config.MATERIALS_MAX_UPLOAD_BYTES,
+        chunk_size=config.MATERIALS_CHUNK_SIZE,
+    )
+    materials_index.record(materials_dir, filename, size, sha256)
+    return {"status": "success", "filename": filename, "size": size, "sha256": sha256}
+
+@app.put("/api/rooms/{room_id}/materials/{filename}")
+async def put_material(room_id: str, filename: str, request: Request):
+    # Тело запроса — сам файл: пишется на диск по мере приема, без разбора multipart
+    check_content_length(request.headers, config.MATERIALS_MAX_UPLOAD_BYTES)
+    filename = safe_filename(filename)
+    materials_dir = room_dir(config.MATERIALS_DIR, room_id)
+    size, sha256 = await save_stream(
+        request.stream(),
+        materials_dir,
+        filename,
+        max_bytes=config.MATERIALS_MAX_UPLOAD_BYTES,
+        chunk_size=config.MATERIALS_CHUNK_SIZE,
+    )
+    materials_index.record(materials_dir, filename, size, sha256)
+    return {"status": "success", "filename": filename, "size": size, "sha256": sha256}
 
 @app.post("/api/rooms/{room_id}/materials/generate")
 async def generate_material(room_id: str, req: MaterialGenRequest):
-    room_dir = os.path.join("materials", room_id)
-    os.makedirs(room_dir, exist_ok=True)
-    content = f"Лекция: {req.title}\n\nОписание: {req.description}\n\nЗначительный объем текста, представляющий собой лекционный материал.\n(Нейросеть генерирует и сохраняет здесь результаты: лекция успешно создана.)"
-    safe_filename = "".join([c for c in req.title if c.isalpha() or c.isdigit() or c==' ']).rstrip() or "generated"
-    filename = f"{safe_filename}.txt"
-    file_path = os.path.join(room_dir, filename)
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    return {"status": "success", "filename": filename}
+    materials_dir = room_dir(config.MATERIALS_DIR, room_id)
+    try:
+        job, _ = material_jobs.submit(room_id, materials_dir, req.title, req.description)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    # Быстрая генерация успевает до ответа, и приложение сразу видит лекцию в списке;
+    # долгая продолжается в фоне (прогресс — в /ws или GET .../materials/jobs/{job_id})
+    if config.MATERIAL_JOB_SYNC_WAIT_S > 0:
+        try:
+            await asyncio.wait_for(job.done.wait(), config.MATERIAL_JOB_SYNC_WAIT_S)
+        except asyncio.TimeoutError:
+            pass
+    if job.status == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=f"Generation failed: {job.error}")
+    return job.to_dict()
+
+@app.get("/api/rooms/{room_id}/materials/jobs/{job_id}")
+def get_material_job(room_id: str, job_id: str):
+    job = material_jobs.get(job_id)
+    if job is None or job.room_id != room_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 @app.get("/api/rooms/{room_id}/materials")
-def list_materials(room_id: str):
-    room_dir = os.path.join("materials", room_id)
-    if not os.path.exists(room_dir):
-        return {"materials": []}
-    files = os.listdir(room_dir)
-    return {"materials": files}
-
-@app.get("/api/rooms/{room_id}/materials/{filename}")
-def download_material(room_id: str, filename: str):
-    file_path = os.path.join("materials", room_id, filename)
-    if os.path.exists(file_path):
-        return FileResponse(path=file_path, filename=filename)
+async def list_materials(room_id: str, request: Request, offset: int = 0, limit: Optional[int] = None):
+    # "materials" — только имена (как раньше, для приложения), "items" — метаданные той же страницы
+    offset = max(offset, 0)
+    limit = None if limit is None else min(max(limit, 1), config.MATERIALS_PAGE_MAX)
+    items, version = await materials_index.list(room_dir(config.MATERIALS_DIR, room_id))
+    etag = list_etag(version, offset, limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    page = items[offset:] if limit is None else items[offset:offset + limit]
+    body = {
+        "materials": [item["name"] for item in page],
+        "items": [
+            {
+                "name": item["name"],
+                "size": item["size"],
+                "mtime": item["mtime_ns"] / 1e9,
+                "sha256": item["sha256"],
+                "mime": item["mime"],
+            }
+            for item in page
+        ],
+        "total": len(items),
+        "offset": offset,
+        "limit": limit,
+    }
+    return JSONResponse(body, headers=headers)
+
+@app.api_route("/api/rooms/{room_id}/materials/{filename}", methods=["GET", "HEAD"])
+def download_material(room_id: str, filename: str, request: Request):
+    file_path = os.path.join(room_dir(config.MATERIALS_DIR, room_id), safe_filename(filename))
+    if os.path.isfile(file_path):
+        return file_response(request, file_path, os.path.basename(file_path))
     raise HTTPException(status_code=404, detail="File not found")
 
 def get_local_ip():
@@ -388,13 +623,9 @@ def get_local_ip():
     return IP
 
 @app.get("/api/rooms/available")
-def get_available_room():
-    i = 1
-    while True:
-        room_id = str(i)
-        if room_id not in rooms or len(rooms[room_id]) == 0:
-            return {"room_id": room_id}
-        i += 1
+async def get_available_room():
+    # Свободная комната среди всех воркеров, а не только этого процесса
+    return {"room_id": await room_bus.find_available_room()}
 
 if __name__ == "__main__":
     ip = get_local_ip()
@@ -404,4 +635,5 @@ if __name__ == "__main__":
     print("="*50)
     print(f"✅ ВВЕДИТЕ ЭТОТ АДРЕС В ТЕЛЕФОНЕ: {ip}:{port}")
     print("="*50 + "\n")
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
+    # Сам объект app, а не "main:app": иначе uvicorn импортирует main второй раз (метрики, пул, модель)
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from materials import write_file_atomic
+
+# Фоновая генерация лекций для /api/rooms/{room_id}/materials/generate.
+# Запрос сразу получает задачу, генератор работает в пуле потоков (не держит HTTP
+# запрос и цикл событий), одинаковые запросы (комната, тема, описание), пока первый
+# еще в работе, получают ту же задачу. Прогресс уходит в on_update(job) — main.py
+# рассылает его подписчикам /ws, а GET .../materials/jobs/{job_id} отдает состояние.
+# Задачи живут в памяти воркера: при нескольких воркерах опрос идет туда же, куда submit.
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def lecture_filename(title):
+    safe_title = "".join([c for c in title if c.isalpha() or c.isdigit() or c == ' ']).rstrip() or "generated"
+    return f"{safe_title}.txt"
+
+
+def template_lecture(title, description, progress):
+    """Заглушка генератора: сюда встанет нейросеть. Вызывается в потоке пула,
+    progress(доля от 0 до 1) можно звать сколько угодно часто."""
+    progress(1.0)
+    return f"Лекция: {title}\n\nОписание: {description}\n\nЗначительный объем текста, представляющий собой лекционный материал.\n(Нейросеть генерирует и сохраняет здесь результаты: лекция успешно создана.)"
+
+
+class GenerationJob:
+    def __init__(self, room_id, materials_dir, title, description):
+        self.id = uuid.uuid4().hex
+        self.room_id = room_id
+        self.materials_dir = materials_dir
+        self.title = title
+        self.description = description
+        self.filename = lecture_filename(title)
+        self.status = JOB_QUEUED
+        self.progress = 0.0
+        self.error = None
+        self.size = None
+        self.sha256 = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = asyncio.Event()
+
+    @property
+    def key(self):
+        return self.room_id, self.title, self.description
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "room_id": self.room_id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "filename": self.filename,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class MaterialJobQueue:
+    def __init__(self, generator=template_lecture, max_workers=1, max_pending=64, history=256, on_update=None):
+        self.generator = generator
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self.history = history
+        self.on_update = on_update
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="material-gen")
+        self._semaphore = None
+        self.jobs = OrderedDict()  # job_id -> GenerationJob, включая завершенные (последние history)
+        self._active = {}  # key -> GenerationJob в очереди или в работе
+        self._tasks = set()
+
+    def submit(self, room_id, materials_dir, title, description):
+        """Возвращает (job, created): created=False, если такая же задача уже в работе."""
+        job = self._active.get((room_id, title, description))
+        if job is not None:
+            return job, False
+        if self.max_pending and len(self._active) >= self.max_pending:
+            raise JobQueueFull(f"{len(self._active)} generation jobs are already pending")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        job = GenerationJob(room_id, materials_dir, title, description)
+        self.jobs[job.id] = job
+        self._active[job.key] = job
+        self._prune()
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._notify(job)
+        return job, True
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done.is_set()]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    def _notify(self, job):
+        if self.on_update is not None:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"[-] Ошибка рассылки прогресса генерации: {e}")
+
+    def _set_progress(self, job, fraction):
+        fraction = min(max(float(fraction), 0.0), 1.0)
+        # Не чаще, чем раз в процент: генератор может звать progress на каждый токен
+        if job.status == JOB_RUNNING and int(fraction * 100) != int(job.progress * 100):
+            job.progress = fraction
+            self._notify(job)
+
+    def _generate(self, job, progress):
+        content = self.generator(job.title, job.description, progress)
+        os.makedirs(job.materials_dir, exist_ok=True)
+        return write_file_atomic(os.path.join(job.materials_dir, job.filename), content)
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+
+        def progress(fraction):
+            loop.call_soon_threadsafe(self._set_progress, job, fraction)
+
+        try:
+            async with self._semaphore:
+                job.status = JOB_RUNNING
+                self._notify(job)
+                job.size, job.sha256 = await loop.run_in_executor(self._executor, self._generate, job, progress)
+            job.status = JOB_DONE
+            job.progress = 1.0
+        except asyncio.CancelledError:
+            job.status = JOB_FAILED
+            job.error = "cancelled"
+            raise
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+            print(f"[-] Генерация '{job.title}' в комнате {job.room_id} упала: {e}")
+        finally:
+            job.finished_at = time.time()
+            self._active.pop(job.key, None)
+            job.done.set()
+            self._notify(job)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,427 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+from fastapi import HTTPException
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+
+# Файлы материалов комнат: materials/<room_id>/<имя>.
+# Загрузка (multipart POST или сырое тело PUT) принимается потоком, без спула всего тела
+# во временный файл Starlette, и пишется чанками в потоке пула — не
+# блокирует цикл событий и сокеты трекинга рук, — сначала во временный .part-файл,
+# затем атомарный os.replace: недокачанный файл никогда не виден в списке. Скачивание поддерживает ETag,
+# If-None-Match / If-Modified-Since (304) и Range / If-Range (206) для докачки.
+# Списки материалов кэшируются в MaterialsIndex (размер, mtime, sha256, mime).
+
+PARTIAL_PREFIX = ".upload-"
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def safe_filename(filename):
+    """Имя файла без каталогов; скрытые имена (в т.ч. временные .part) запрещены."""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if not name or name.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    return name
+
+
+def room_dir(root, room_id):
+    if not room_id or room_id.startswith(".") or os.path.basename(room_id) != room_id:
+        raise HTTPException(status_code=400, detail="Invalid room id")
+    return os.path.join(root, room_id)
+
+
+def is_visible(name):
+    return not name.startswith(".")
+
+
+def _partial_path(dst_path):
+    return os.path.join(os.path.dirname(dst_path), f"{PARTIAL_PREFIX}{uuid.uuid4().hex}.part")
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _too_large(max_bytes):
+    return HTTPException(status_code=413, detail=f"File is larger than {max_bytes} bytes")
+
+
+def _commit(out, tmp_path, dst_path):
+    out.flush()
+    os.fsync(out.fileno())
+    out.close()
+    os.replace(tmp_path, dst_path)
+
+
+async def save_stream(chunks, dst_dir, filename, max_bytes=0, chunk_size=1024 * 1024):
+    """Пишет тело запроса (async-итератор чанков) в dst_dir/filename по мере приема.
+
+    Тело не буферизуется во временном файле Starlette: чанки копятся до chunk_size
+    и пишутся в потоке пула. Для multipart чанки дает MultipartFileReader.file_chunks().
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    dst_path = os.path.join(dst_dir, filename)
+    tmp_path = _partial_path(dst_path)
+    written = 0
+    pending = bytearray()
+    digest = hashlib.sha256()
+
+    def flush(out, data):
+        digest.update(data)
+        out.write(data)
+
+    try:
+        out = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                written += len(chunk)
+                if max_bytes and written > max_bytes:
+                    raise _too_large(max_bytes)
+                pending += chunk
+                if len(pending) >= chunk_size:
+                    await run_in_threadpool(flush, out, pending)
+                    pending.clear()
+            if pending:
+                await run_in_threadpool(flush, out, pending)
+            await run_in_threadpool(_commit, out, tmp_path, dst_path)
+        finally:
+            out.close()
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return written, digest.hexdigest()
+
+
+class MultipartFileReader:
+    """Потоковый разбор multipart/form-data: данные одного файлового поля по мере приема.
+
+    В отличие от request.form(), тело не спулится целиком во временный файл до проверки
+    размера: каждый чанк из сети сразу идет в парсер, а прием обрывается (413), как только
+    тело превысило лимит с запасом на заголовки. Данные файла отдает file_chunks() —
+    их можно передать прямо в save_stream(), которая проверяет точный размер файла.
+    """
+
+    def __init__(self, headers, chunks, field, max_bytes=0):
+        content_type, params = parse_options_header(headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+        self.field = field.encode()
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.filename = None
+        self._chunks = chunks.__aiter__()
+        self._data = []          # Куски файлового поля из последнего чанка сети
+        self._in_file = False
+        self._done = False       # Файловое поле принято целиком
+        self._eof = False
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    async def open(self):
+        """Читает тело до заголовков файлового поля и возвращает имя файла из них."""
+        while self.filename is None:
+            if self._eof:
+                raise HTTPException(status_code=422, detail=f"Field '{self.field.decode()}' is required")
+            await self._feed()
+        return self.filename
+
+    async def file_chunks(self):
+        while True:
+            data, self._data = self._data, []
+            for piece in data:
+                yield piece
+            if self._done:
+                return
+            if self._eof:
+                raise HTTPException(status_code=400, detail="Multipart body ended inside the file")
+            await self._feed()
+
+    async def _feed(self):
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            return
+        self.received += len(chunk)
+        if self.max_bytes and self.received > self.max_bytes + MULTIPART_OVERHEAD:
+            raise _too_large(self.max_bytes)
+        try:
+            self._parser.write(chunk)
+        except FormParserError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid multipart body: {e}")
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field, self._header_value = b"", b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # Берем первое поле с нужным именем и именем файла, остальные части пропускаем
+        if options.get(b"name") == self.field and b"filename" in options and self.filename is None:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self._in_file = True
+
+    def _on_part_data(self, data, start, end):
+        if self._in_file:
+            self._data.append(bytes(data[start:end]))
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self._done = True
+
+
+def write_file_atomic(dst_path, data):
+    """Записывает bytes/str целиком через временный файл и os.replace. Возвращает (размер, sha256)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    tmp_path = _partial_path(dst_path)
+    try:
+        out = open(tmp_path, "wb")
+        try:
+            out.write(data)
+            _commit(out, tmp_path, dst_path)
+        finally:
+            out.close()
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+def _hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scan_room(path, known):
+    """Метаданные файлов папки; sha256 пересчитывается только для новых/измененных файлов."""
+    items = {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not is_visible(entry.name) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            item = known.get(entry.name)
+            if item is None or item["size"] != stat.st_size or item["mtime_ns"] != stat.st_mtime_ns:
+                item = {
+                    "name": entry.name,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": _hash_file(entry.path),
+                    "mime": mimetypes.guess_type(entry.name)[0] or "application/octet-stream",
+                }
+            items[entry.name] = item
+    return items
+
+
+class MaterialsIndex:
+    """Кэш списков материалов по папкам комнат.
+
+    Список папки пересобирается, только когда меняется mtime самой папки (файл
+    добавлен, удален или заменен через os.replace — в т.ч. другим воркером) или
+    после invalidate(). В остальное время опрос списка стоит один os.stat.
+    """
+
+    def __init__(self):
+        self._rooms = {}  # путь папки -> {"dir_mtime_ns", "items" (отсортированы по имени), "version", "known"}
+        self._locks = {}
+
+    def record(self, path, name, size, sha256):
+        # Загрузка уже посчитала хэш: при пересборке файл не придется читать заново
+        room = self._rooms.setdefault(path, {"dir_mtime_ns": None, "items": [], "version": "", "known": {}})
+        stat = os.stat(os.path.join(path, name))
+        room["known"][name] = {
+            "name": name,
+            "size": size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "mime": mimetypes.guess_type(name)[0] or "application/octet-stream",
+        }
+        room["dir_mtime_ns"] = None
+
+    def invalidate(self, path):
+        room = self._rooms.get(path)
+        if room is not None:
+            room["dir_mtime_ns"] = None
+
+    async def list(self, path):
+        """(items, version) — элементы папки по имени и хэш всего списка для ETag."""
+        try:
+            dir_mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._rooms.pop(path, None)
+            return [], ""
+        room = self._rooms.get(path)
+        if room is not None and room["dir_mtime_ns"] == dir_mtime_ns:
+            return room["items"], room["version"]
+
+        # Один пересчет на папку, даже если весь класс опрашивает ее одновременно
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            room = self._rooms.get(path)
+            dir_mtime_ns = os.stat(path).st_mtime_ns
+            if room is not None and room["dir_mtime_ns"] == dir_mtime_ns:
+                return room["items"], room["version"]
+            known = room["known"] if room is not None else {}
+            scanned = await run_in_threadpool(_scan_room, path, known)
+            items = [scanned[name] for name in sorted(scanned)]
+            version = hashlib.sha1(
+                "\n".join(f"{i['name']}:{i['size']}:{i['mtime_ns']}:{i['sha256']}" for i in items).encode()
+            ).hexdigest()
+            # mtime папки снят до сканирования: изменения во время скана вызовут еще одну пересборку
+            self._rooms[path] = {"dir_mtime_ns": dir_mtime_ns, "items": items, "version": version, "known": scanned}
+        return items, version
+
+
+def list_etag(version, offset, limit):
+    return f'W/"{version}-{offset}-{limit or "all"}"'
+
+
+def not_modified(request, etag):
+    header = request.headers.get("if-none-match")
+    return header is not None and _etag_matches(header, etag)
+
+
+def check_content_length(headers, max_bytes):
+    # Отказываем до разбора multipart, если клиент честно заявил слишком большое тело
+    # (с запасом на заголовки multipart; точный размер файла проверяется при копировании)
+    length = headers.get("content-length")
+    if max_bytes and length and length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD:
+        raise _too_large(max_bytes)
+
+
+def file_etag(stat):
+    return '"' + hashlib.md5(f"{stat.st_mtime_ns}-{stat.st_size}".encode()).hexdigest() + '"'
+
+
+def _etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    # Слабое сравнение (RFC 9110): префикс W/ не учитывается
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def _not_modified_since(header, mtime):
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _parse_range(header, size):
+    """Один диапазон "bytes=a-b" -> (start, end) включительно; None — отдать файл целиком."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Несколько диапазонов не поддерживаем: по RFC 9110 можно ответить полным файлом
+        return None
+    start_s, sep, end_s = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_s == "":
+            suffix = int(end_s)
+            if suffix <= 0:
+                raise ValueError
+            return max(0, size - suffix), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _read_chunks(path, start, length, chunk_size):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(request, path, filename, chunk_size=256 * 1024):
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    quoted = quote(filename)
+    disposition = f'attachment; filename="{filename}"' if quoted == filename else f"attachment; filename*=utf-8''{quoted}"
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",  # Кэшировать можно, но перед использованием сверяться по ETag
+        "Content-Disposition": disposition,
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since and _not_modified_since(if_modified_since, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    size = stat.st_size
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range: докачка только если файл не изменился с прошлой части, иначе отдаем целиком
+    if range_header and size and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    length = end - start + 1 if size else 0
+    headers["Content-Length"] = str(length)
+
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        iterate_in_threadpool(_read_chunks(path, start, length, chunk_size)),
+        status_code=status,
+        headers=headers,
+        media_type=media_type,
+    )
@@ -0,0 +1,142 @@
+import bisect
+
+# Легкие метрики процесса в текстовом формате Prometheus (без prometheus_client).
+# Все обновления идут из потока цикла событий, поэтому без блокировок: observe() —
+# это bisect и пара сложений. Значения лейблов передаются позиционно, в порядке labelnames.
+# При нескольких воркерах uvicorn у каждого свой /metrics (Prometheus различает их по instance/pod).
+
+# Секунды: от долей миллисекунды (декодирование) до секунд (зависший трекер)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # tuple(labelvalues) -> число
+        # collect() -> {labelvalues: число}: значения, которые уже считает кто-то другой (GATE_TOTALS и т.п.)
+        self._collect = collect
+
+    def inc(self, amount=1, *labelvalues):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        values = dict(self.values)
+        if self._collect is not None:
+            for labelvalues, value in self._collect().items():
+                values[labelvalues if isinstance(labelvalues, tuple) else (labelvalues,)] = value
+        for labelvalues, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, *labelvalues):
+        self.values[labelvalues] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # tuple(labelvalues) -> [счетчики по корзинам (+Inf последней), сумма, количество]
+
+    def observe(self, value, *labelvalues):
+        series = self.series.get(labelvalues)
+        if series is None:
+            series = self.series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        # Храним попадания в корзину, накопительные суммы считаем только при выдаче
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labelvalues, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = ("le", _format_value(bound))
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=(), collect=None):
+        return self._register(Counter(name, help, labelnames, collect))
+
+    def gauge(self, name, help, labelnames=(), collect=None):
+        return self._register(Gauge(name, help, labelnames, collect))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class StageStats:
+    """Времена этапов одного соединения: пишет в общую гистограмму (лейбл stage)
+    и копит свои count/sum/max для сообщения debug_stats."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.stages = {}  # stage -> [count, sum, max]
+
+    def observe(self, stage, seconds):
+        self.histogram.observe(seconds, stage)
+        totals = self.stages.get(stage)
+        if totals is None:
+            totals = self.stages[stage] = [0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += seconds
+        if seconds > totals[2]:
+            totals[2] = seconds
+
+    def snapshot(self):
+        return {
+            stage: {"count": count, "avg_ms": round(total / count * 1000, 3), "max_ms": round(peak * 1000, 3)}
+            for stage, (count, total, peak) in self.stages.items()
+        }
@@ -0,0 +1,127 @@
+"""Уменьшенные варианты модели жестов для сервера: float16 и int8 из gesture_model.npz.
+
+Каждый вариант сравнивается с исходной float32 моделью на отложенной выборке из обучения
+(gesture_holdout.npz; если ее нет — на всем датасете, и точность тогда завышена):
+точность, совпадение топ-1 с float32, максимальное расхождение вероятностей, размер файла
+и задержка NumpyGestureModel.predict на батче 1 и 32. Отчет печатается и пишется в JSON.
+
+Варианты уменьшают только файл для скачивания (например, на устройство). Задержку и память
+сервера они не меняют: NumpyGestureModel.load разворачивает веса в float32, а считать прямо
+во float16/int8 NumPy умеет только без BLAS, в десятки раз медленнее float32. Поэтому
+сервер всегда работает с исходным gesture_model.npz, а точность в отчете — цена меньшего файла.
+
+    python quantize_model.py --repeats 200
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from collect_and_train import DATASET_PATH, HOLDOUT_PATH, sequence_length
+from gesture_dataset import GestureDataset
+from gesture_runtime import MODEL_VARIANTS, SCALE_SUFFIX, NumpyGestureModel, load_gesture_classes, quantize_int8, variant_path
+
+# Квантуем только матрицы: смещения крошечные, а ошибка в них сдвигает все выходы слоя
+MATRIX_NAMES = ("kernel", "recurrent_kernel")
+
+
+def quantize_npz(src_path, dst_path, variant):
+    with np.load(src_path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    out = {"spec": arrays.pop("spec")}
+    for key, weight in arrays.items():
+        is_matrix = key.split("/", 1)[1] in MATRIX_NAMES
+        if variant == "float16":
+            out[key] = weight.astype(np.float16)
+        elif variant == "int8" and is_matrix:
+            out[key], out[key + SCALE_SUFFIX] = quantize_int8(weight)
+        else:
+            out[key] = weight.astype(np.float32)
+    np.savez_compressed(dst_path, **out)
+
+
+def load_eval_set(holdout_path, classes):
+    if os.path.exists(holdout_path):
+        with np.load(holdout_path) as data:
+            return data["X"].astype(np.float32), data["y"], "holdout"
+    # Без отложенной выборки берем весь датасет: метки — номера жестов в gesture_classes.txt
+    print(f"[-] {holdout_path} не найден (модель обучена до его появления), оцениваем на всем датасете")
+    dataset = GestureDataset(DATASET_PATH, sequence_length=sequence_length)
+    X, y = [], []
+    for idx, action in enumerate(classes):
+        sequences = dataset.load(action)
+        if len(sequences):
+            X.append(np.asarray(sequences, dtype=np.float32))
+            y.extend([idx] * len(sequences))
+    if not X:
+        raise SystemExit("[!] Нет ни отложенной выборки, ни датасета для оценки")
+    return np.concatenate(X), np.array(y), "dataset"
+
+
+def latency_ms(model, batch, repeats):
+    model.predict(batch)  # Прогрев
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.predict(batch)
+        times.append(time.perf_counter() - started)
+    return round(float(np.median(times)) * 1000, 3)
+
+
+def evaluate(path, X, y, reference, repeats):
+    model = NumpyGestureModel.load(path)
+    probs = model.predict(X)
+    batch32 = X[np.arange(32) % len(X)]
+    result = {
+        "path": path,
+        "size_bytes": os.path.getsize(path),
+        "accuracy": round(float(np.mean(probs.argmax(axis=1) == y)), 4),
+        "latency_batch1_ms": latency_ms(model, X[:1], repeats),
+        "latency_batch32_ms": latency_ms(model, batch32, repeats),
+    }
+    if reference is not None:
+        result["top1_agreement"] = round(float(np.mean(probs.argmax(axis=1) == reference.argmax(axis=1))), 4)
+        result["max_prob_diff"] = round(float(np.abs(probs - reference).max()), 5)
+    return result, probs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='gesture_model.npz', help='исходная float32 модель (collect_and_train.export_model)')
+    parser.add_argument('--holdout', default=HOLDOUT_PATH)
+    parser.add_argument('--classes', default='gesture_classes.txt')
+    parser.add_argument('--repeats', type=int, default=100, help='замеров задержки на каждый батч')
+    parser.add_argument('--report', help='JSON с отчетом (по умолчанию <модель>.quant_report.json)')
+    args = parser.parse_args()
+
+    classes = load_gesture_classes(args.classes)
+    X, y, source = load_eval_set(args.holdout, classes if classes is not None else [])
+    print(f"[+] Оценка на {len(X)} дублях ({source})")
+
+    report = {"model": args.model, "eval_set": source, "samples": len(X), "variants": {}}
+    reference = None
+    for variant in MODEL_VARIANTS:
+        path = variant_path(args.model, variant)
+        if variant != "float32":
+            quantize_npz(args.model, path, variant)
+        result, probs = evaluate(path, X, y, reference, args.repeats)
+        if reference is None:
+            reference = probs
+        report["variants"][variant] = result
+
+    print(f"\n{'вариант':>8}{'размер КБ':>11}{'точность':>10}{'топ-1=fp32':>12}{'max Δp':>9}{'батч 1 мс':>11}{'батч 32 мс':>12}")
+    for variant, result in report["variants"].items():
+        print(f"{variant:>8}{result['size_bytes'] / 1024:>11.1f}{result['accuracy']:>10.4f}"
+              f"{result.get('top1_agreement', 1.0):>12.4f}{result.get('max_prob_diff', 0.0):>9.4f}"
+              f"{result['latency_batch1_ms']:>11.3f}{result['latency_batch32_ms']:>12.3f}")
+
+    report_path = args.report or os.path.splitext(args.model)[0] + '.quant_report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n[+] Отчет: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""Воспроизведение записанной сессии /ws/hand_tracking (SESSION_RECORD_DIR, см. session_recorder.py).
+
+Кадры идут тем же путем, что на сервере и с теми же настройками из config.py:
+FrameDecoder -> (HandRoiCropper) -> MediaPipe в пуле процессов -> окно GestureRecognizer
+с фильтром предиктов -> модель жестов через GestureInferenceScheduler. Время для окна и
+кулдауна слов берется из записи, поэтому субтитры не зависят от скорости воспроизведения.
+
+--speed original — кадры приходят с исходными интервалами, а отставшие вытесняются свежими
+(LatestFrameMailbox, как на сервере); --speed max — каждый кадр подряд без пауз.
+Каждый кадр — строка JSON в --out (времена этапов в мс, число рук, субтитр), в конце —
+сводка по этапам и лента распознанных слов.
+
+    python replay_session.py recordings/20260101-120000-ab12cd34.nbrec --speed max
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from fastapi import WebSocketDisconnect
+
+import config
+from frame_decoder import FORMAT_LANDMARKS, HEADER_SIZE, FrameDecoder, LandmarkClock, parse_landmarks
+from frame_mailbox import LatestFrameMailbox
+from gesture_inference import GestureInferenceScheduler
+from gesture_recognizer import GestureRecognizer, hands_from_keypoints, keypoints_from_hands
+from gesture_runtime import load_gesture_classes, load_gesture_model
+from hand_roi import HandRoiCropper
+from inference_gate import InferenceGate
+from session_recorder import read_session
+from tracker_pool import HandTrackerPool
+
+STAGES = ("decode", "track", "mediapipe", "predict", "frame")
+
+
+class Replay:
+    def __init__(self, tracker_pool, scheduler, actions, out):
+        self.tracker_pool = tracker_pool
+        self.tracker_session = tracker_pool.open_session()
+        # Как в main.py: с обрезкой по рукам декодер отдает полный кадр, уменьшается только рамка
+        self.roi_cropper = HandRoiCropper(padding=config.HAND_ROI_PADDING, max_side=config.TRACKER_MAX_SIDE) if config.HAND_ROI_ENABLED else None
+        self.decoder = FrameDecoder(max_side=0 if self.roi_cropper is not None else config.TRACKER_MAX_SIDE)
+        self.gate = InferenceGate(
+            motion_threshold=config.GATE_MOTION_THRESHOLD,
+            stride=config.GATE_STRIDE,
+            cooldown_motion_threshold=config.GATE_COOLDOWN_MOTION_THRESHOLD,
+        )
+        self.recognizer = GestureRecognizer(scheduler, actions, gate=self.gate)
+        self.out = out
+        self.timings = {stage: [] for stage in STAGES}
+        self.invalid = 0
+        self.errors = 0
+        self.words = []  # (секунда записи, слово)
+        self.first_arrival = None
+        self.landmark_clock = LandmarkClock(max_drift=config.LANDMARK_MAX_CLOCK_DRIFT_S)
+
+    async def process(self, index, arrived_at, data, lag=None):
+        if self.first_arrival is None:
+            self.first_arrival = arrived_at
+        record = {"frame": index, "t": round(arrived_at - self.first_arrival, 4)}
+        if lag is not None:
+            record["lag_ms"] = round(lag * 1000, 3)
+
+        frame_start = time.perf_counter()
+        if len(data) >= HEADER_SIZE and data[0] == FORMAT_LANDMARKS:
+            await self._process_landmarks(record, arrived_at, data, frame_start)
+            return
+        img_rgb = self.decoder.decode(data)[0] if len(data) >= HEADER_SIZE else None
+        if img_rgb is None:
+            self.invalid += 1
+            self._emit(dict(record, invalid=True))
+            return
+        decoded = time.perf_counter()
+
+        try:
+            if self.roi_cropper is not None:
+                crop, roi = self.roi_cropper.crop(img_rgb)
+                hands = self.roi_cropper.to_full_frame(await self.tracker_pool.process(self.tracker_session, crop), roi)
+                self.roi_cropper.update(hands)
+            else:
+                hands = await self.tracker_pool.process(self.tracker_session, img_rgb)
+        except Exception as e:
+            print(f"🚨 [REPLAY] Ошибка MediaPipe на кадре {index}: {e}")
+            self.errors += 1
+            self._emit(dict(record, error=str(e)))
+            return
+        tracked = time.perf_counter()
+
+        # Время окна — время прихода кадра на сервер, а не время воспроизведения
+        subtitle = await self.recognizer.update(keypoints_from_hands(hands), arrived_at)
+        predicted = time.perf_counter()
+
+        self._finish(record, hands, subtitle, {
+            "decode": decoded - frame_start,
+            "track": tracked - decoded,
+            "mediapipe": self.tracker_session.last_process_s,
+            "predict": predicted - tracked,
+            "frame": predicted - frame_start,
+        })
+
+    async def _process_landmarks(self, record, arrived_at, data, frame_start):
+        # Точки с устройства: как на сервере, интервалы — по часам устройства
+        parsed = parse_landmarks(data)
+        if parsed is None:
+            self.invalid += 1
+            self._emit(dict(record, invalid=True))
+            return
+        captured_at, keypoints = parsed
+        now = self.landmark_clock.map(captured_at, arrived_at)
+        if self.landmark_clock.reanchored:
+            record["clock_reanchored"] = True
+        decoded = time.perf_counter()
+        subtitle = await self.recognizer.update(keypoints, now)
+        predicted = time.perf_counter()
+        self._finish(record, hands_from_keypoints(keypoints), subtitle, {
+            "decode": decoded - frame_start,
+            "predict": predicted - decoded,
+            "frame": predicted - frame_start,
+        })
+
+    def _finish(self, record, hands, subtitle, stages):
+        for stage, seconds in stages.items():
+            self.timings[stage].append(seconds)
+        if subtitle:
+            self.words.append((record["t"], subtitle))
+            print(f"[{record['t']:8.2f} с] {subtitle}")
+        self._emit(dict(
+            record,
+            **{f"{stage}_ms": round(seconds * 1000, 3) for stage, seconds in stages.items()},
+            hands=len(hands),
+            subtitle=subtitle,
+        ))
+
+    def _emit(self, record):
+        if self.out is not None:
+            self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.tracker_pool.close_session(self.tracker_session)
+
+
+async def replay_max(replay, records):
+    total = 0
+    for index, (arrived_at, data) in enumerate(records):
+        await replay.process(index, arrived_at, data)
+        total += 1
+    return total, 0
+
+
+async def replay_original(replay, records):
+    # Кадры кладутся в ящик по исходному расписанию; обработка берет самый свежий, как на сервере
+    mailbox = LatestFrameMailbox()
+    start = time.perf_counter()
+    total = 0
+
+    async def feed():
+        nonlocal total
+        first = None
+        for index, (arrived_at, data) in enumerate(records):
+            total += 1
+            first = arrived_at if first is None else first
+            due = start + (arrived_at - first)
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            mailbox.put((index, arrived_at, due, data))
+        # Даем обработать последний кадр, затем закрываем ящик
+        while mailbox.pending:
+            await asyncio.sleep(0.01)
+        mailbox.close()
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            try:
+                index, arrived_at, due, data = await mailbox.get()
+            except WebSocketDisconnect:
+                break
+            await replay.process(index, arrived_at, data, lag=time.perf_counter() - due)
+    finally:
+        feeder.cancel()
+    return total, mailbox.dropped
+
+
+def print_summary(replay, total, dropped, elapsed):
+    processed = len(replay.timings["frame"])
+    print(f"\nКадров в записи: {total}, обработано: {processed}, пропущено: {dropped}, "
+          f"битых: {replay.invalid}, ошибок: {replay.errors}, за {elapsed:.1f} с ({processed / max(elapsed, 1e-9):.1f} FPS)")
+    print(f"{'этап':>10}{'p50 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+    for stage, values in replay.timings.items():
+        if values:
+            ms = np.array(values) * 1000
+            print(f"{stage:>10}{np.percentile(ms, 50):>10.2f}{np.percentile(ms, 99):>10.2f}{ms.max():>10.2f}")
+    print(f"Предикты LSTM: {replay.gate.stats}")
+    print(f"Слова: {' '.join(word for _, word in replay.words) or '—'}")
+
+
+async def run(args):
+    meta, records = read_session(args.recording)
+    print(f"[+] Запись {args.recording}: начата {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(meta['started_at']))}, "
+          f"параметры {meta.get('query', {})}")
+    try:
+        model, backend = load_gesture_model(
+            config.GESTURE_MODEL_BACKEND, config.GESTURE_MODEL_NUMPY_PATH, config.GESTURE_MODEL_KERAS_PATH,
+        )
+        actions = load_gesture_classes(args.classes)
+        if actions is None:
+            raise FileNotFoundError(args.classes)
+        scheduler = GestureInferenceScheduler(
+            model, max_batch_size=config.GESTURE_BATCH_MAX_SIZE, max_wait_ms=config.GESTURE_BATCH_MAX_WAIT_MS
+        )
+        print(f"[+] Модель жестов загружена ({backend}): {actions.tolist()}")
+    except Exception as e:
+        scheduler, actions = None, []
+        print(f"[-] Модель жестов не загружена, считаем только MediaPipe: {e}")
+
+    tracker_pool = HandTrackerPool(
+        num_workers=1,
+        frame_bytes=config.TRACKER_FRAME_BYTES,
+        hands_kwargs=config.TRACKER_HANDS_KWARGS,
+        timeout=config.TRACKER_TIMEOUT_S,
+    )
+    tracker_pool.start()
+    out = open(args.out or args.recording + ".replay.jsonl", "w", encoding="utf-8")
+    replay = Replay(tracker_pool, scheduler, actions, out)
+    # Прогрев: импорт MediaPipe в процессе пула и создание Hands не должны попасть в первый кадр
+    warmup = tracker_pool.open_session()
+    await tracker_pool.process(warmup, np.zeros((64, 64, 3), dtype=np.uint8))
+    tracker_pool.close_session(warmup)
+    started = time.perf_counter()
+    try:
+        replay_frames = replay_max if args.speed == "max" else replay_original
+        total, dropped = await replay_frames(replay, records)
+        print_summary(replay, total, dropped, time.perf_counter() - started)
+        print(f"[+] Покадровые времена: {out.name}")
+    finally:
+        out.close()
+        replay.close()
+        if scheduler is not None:
+            await scheduler.close()
+        tracker_pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help='файл .nbrec из SESSION_RECORD_DIR')
+    parser.add_argument('--speed', choices=('original', 'max'), default='original')
+    parser.add_argument('--out', help='куда писать JSON по кадрам (по умолчанию <запись>.replay.jsonl)')
+    parser.add_argument('--classes', default='gesture_classes.txt')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import uuid
+
+# Room registry + message bus for WebRTC signaling.
+#
+# A bus tracks which peers are in which room (across all workers) and carries relayed
+# messages to whichever worker holds the recipient's socket. The worker hands each
+# message to its `deliver(room_id, text, target, exclude)` callback for local peers.
+#
+# - InMemoryRoomBus: single process, the previous behaviour.
+# - RedisRoomBus: any Redis-compatible server (redis, valkey, KeyDB; fakeredis as a
+#   local stand-in), so several uvicorn workers or nodes share rooms.
+
+
+class InMemoryRoomBus:
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.members = {}  # room_id -> set(client_id)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def join(self, room_id, client_id):
+        """Registers the peer and returns the ids of the others already in the room."""
+        room = self.members.setdefault(room_id, set())
+        others = list(room)
+        room.add(client_id)
+        return others
+
+    async def leave(self, room_id, client_id):
+        room = self.members.get(room_id)
+        if room is not None:
+            room.discard(client_id)
+            if not room:
+                del self.members[room_id]
+
+    async def is_member(self, room_id, client_id):
+        return client_id in self.members.get(room_id, ())
+
+    async def room_size(self, room_id):
+        return len(self.members.get(room_id, ()))
+
+    async def publish(self, room_id, text, target=None, exclude=None):
+        self.deliver(room_id, text, target, exclude)
+
+    async def find_available_room(self):
+        i = 1
+        while True:
+            room_id = str(i)
+            if await self.room_size(room_id) == 0:
+                return room_id
+            i += 1
+
+
+class RedisRoomBus:
+    """Rooms shared through Redis.
+
+    Membership is a hash nb:room:<id> of client_id -> worker_id. Every worker keeps a
+    heartbeat key with a TTL, so peers of a crashed worker are purged lazily instead of
+    haunting rooms forever. Messages go through the pub/sub channel nb:room:<id>:bus,
+    which a worker subscribes to while it has local peers in that room.
+
+    Both background loops survive Redis outages: errors are logged and retried with
+    exponential backoff. After a reconnect the reader resubscribes to the channels of
+    local rooms, and the heartbeat re-registers local peers whenever it finds its key
+    gone (expired during the outage, or a Redis restart dropped the data).
+    """
+
+    KEY_PREFIX = "nb:"
+    RETRY_MIN_S = 0.5
+    RETRY_MAX_S = 10.0
+
+    def __init__(self, deliver, url=None, client=None, heartbeat_ttl=30):
+        if client is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:
+                raise ImportError("SIGNAL_BACKEND=redis requires the redis package (pip install redis)") from e
+            client = aioredis.from_url(url, decode_responses=True)
+        self.redis = client
+        self.deliver = deliver
+        self.heartbeat_ttl = heartbeat_ttl
+        self.worker_id = uuid.uuid4().hex
+        self._local_members = {}  # room_id -> set(client_id) of local peers (subscribed while non-empty)
+        self._stale_members = set()  # (room_id, client_id) whose removal from Redis failed, retried on reconnect
+        self._pubsub = None
+        self._reader_task = None
+        self._heartbeat_task = None
+
+    def _room_key(self, room_id):
+        return f"{self.KEY_PREFIX}room:{room_id}"
+
+    def _channel(self, room_id):
+        return f"{self.KEY_PREFIX}room:{room_id}:bus"
+
+    def _worker_key(self, worker_id):
+        return f"{self.KEY_PREFIX}worker:{worker_id}"
+
+    async def start(self):
+        await self.redis.set(self._worker_key(self.worker_id), 1, ex=self.heartbeat_ttl)
+        self._pubsub = self.redis.pubsub()
+        loop = asyncio.get_running_loop()
+        self._heartbeat_task = loop.create_task(self._heartbeat_loop())
+        self._reader_task = loop.create_task(self._reader_loop())
+
+    async def close(self):
+        for task in (self._reader_task, self._heartbeat_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        try:
+            if self._pubsub is not None:
+                await self._pubsub.aclose()
+            await self.redis.delete(self._worker_key(self.worker_id))
+        except Exception as e:
+            print(f"[WS] ! Signaling bus close failed: {e}")
+
+    def _next_delay(self, delay):
+        return self.RETRY_MIN_S if delay is None else min(delay * 2, self.RETRY_MAX_S)
+
+    async def _register_local_members(self):
+        for room_id, client_id in list(self._stale_members):
+            await self.redis.hdel(self._room_key(room_id), client_id)
+            self._stale_members.discard((room_id, client_id))
+        for room_id, members in list(self._local_members.items()):
+            if members:
+                await self.redis.hset(self._room_key(room_id), mapping={cid: self.worker_id for cid in members})
+
+    async def _heartbeat_loop(self):
+        retry = None
+        while True:
+            await asyncio.sleep(self.heartbeat_ttl / 3 if retry is None else retry)
+            try:
+                previous = await self.redis.set(self._worker_key(self.worker_id), 1, ex=self.heartbeat_ttl, get=True)
+                if previous is None:
+                    # Other workers may already have purged our peers as dead
+                    await self._register_local_members()
+                    print(f"[WS] + Signaling bus heartbeat restored, re-registered {sum(map(len, self._local_members.values()))} peers")
+                retry = None
+            except Exception as e:
+                # Retry sooner than the regular beat, the key expires after heartbeat_ttl
+                retry = min(self._next_delay(retry), self.heartbeat_ttl / 3)
+                print(f"[WS] ! Signaling bus heartbeat failed: {e}; retrying in {retry:.1f}s")
+
+    async def _resubscribe(self):
+        old, self._pubsub = self._pubsub, self.redis.pubsub()
+        try:
+            await old.aclose()
+        except Exception:
+            pass
+        channels = [self._channel(room_id) for room_id, members in self._local_members.items() if members]
+        if channels:
+            await self._pubsub.subscribe(*channels)
+        await self.redis.set(self._worker_key(self.worker_id), 1, ex=self.heartbeat_ttl)
+        await self._register_local_members()
+        print(f"[WS] + Signaling bus reconnected, resubscribed to {len(channels)} rooms")
+
+    async def _reader_loop(self):
+        retry = None
+        while True:
+            try:
+                if retry is not None:
+                    await self._resubscribe()
+                    retry = None
+                if not self._pubsub.subscribed:
+                    # get_message() returns immediately without subscriptions
+                    await asyncio.sleep(0.05)
+                    continue
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                retry = self._next_delay(retry)
+                print(f"[WS] ! Signaling bus connection lost: {e}; reconnecting in {retry:.1f}s")
+                await asyncio.sleep(retry)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            try:
+                envelope = json.loads(message["data"])
+                room_id = message["channel"][len(self.KEY_PREFIX) + len("room:"):-len(":bus")]
+                self.deliver(room_id, envelope["text"], envelope.get("target"), envelope.get("exclude"))
+            except Exception as e:
+                print(f"[WS] ! Bad message on signaling bus: {e}")
+
+    async def _live_members(self, room_id):
+        members = await self.redis.hgetall(self._room_key(room_id))
+        if not members:
+            return {}
+        worker_ids = sorted(set(members.values()))
+        alive = await self.redis.mget([self._worker_key(w) for w in worker_ids])
+        dead = {w for w, flag in zip(worker_ids, alive) if flag is None}
+        if dead:
+            stale = [cid for cid, w in members.items() if w in dead]
+            await self.redis.hdel(self._room_key(room_id), *stale)
+            members = {cid: w for cid, w in members.items() if w not in dead}
+        return members
+
+    async def join(self, room_id, client_id):
+        others = list(await self._live_members(room_id))
+        await self.redis.hset(self._room_key(room_id), client_id, self.worker_id)
+        local = self._local_members.setdefault(room_id, set())
+        local.add(client_id)
+        if len(local) == 1:
+            try:
+                await self._pubsub.subscribe(self._channel(room_id))
+            except Exception:
+                # Roll back, or the heartbeat would keep re-registering a peer nobody serves
+                self._forget_local(room_id, client_id)
+                try:
+                    await self.redis.hdel(self._room_key(room_id), client_id)
+                except Exception:
+                    self._stale_members.add((room_id, client_id))
+                raise
+        return others
+
+    def _forget_local(self, room_id, client_id):
+        local = self._local_members.get(room_id, set())
+        local.discard(client_id)
+        if not local:
+            self._local_members.pop(room_id, None)
+        return local
+
+    async def leave(self, room_id, client_id):
+        # Forget the peer locally first, so a reconnect never re-registers it
+        local = self._forget_local(room_id, client_id)
+        try:
+            await self.redis.hdel(self._room_key(room_id), client_id)
+        except Exception:
+            self._stale_members.add((room_id, client_id))
+            raise
+        if not local:
+            await self._pubsub.unsubscribe(self._channel(room_id))
+
+    async def is_member(self, room_id, client_id):
+        return bool(await self.redis.hexists(self._room_key(room_id), client_id))
+
+    async def room_size(self, room_id):
+        return len(await self._live_members(room_id))
+
+    async def publish(self, room_id, text, target=None, exclude=None):
+        envelope = json.dumps({"text": text, "target": target, "exclude": exclude})
+        await self.redis.publish(self._channel(room_id), envelope)
+
+    async def find_available_room(self):
+        i = 1
+        while True:
+            room_id = str(i)
+            if await self.room_size(room_id) == 0:
+                return room_id
+            i += 1
+
+
+def make_room_bus(backend, deliver, redis_url=None):
+    if backend == "memory":
+        return InMemoryRoomBus(deliver)
+    if backend == "redis":
+        return RedisRoomBus(deliver, url=redis_url)
+    raise ValueError(f"Unknown SIGNAL_BACKEND: {backend}")
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class KeypointRingBuffer:
+    """Окно последних кадров для LSTM: кольцевой буфер (length, size) float32.
+
+    Каждая строка пишется дважды (в i и i + length), поэтому окно по порядку
+    от старого кадра к новому — всегда непрерывный срез без копирования.
+    """
+
+    def __init__(self, length=30, size=126):
+        self.length = length
+        self.size = size
+        self._data = np.zeros((2 * length, size), dtype=np.float32)
+        self._next = 0   # Куда пишем следующий кадр
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def is_full(self):
+        return self._count == self.length
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
+
+    def push(self, keypoints, repeat=1):
+        """Добавляет кадр repeat раз подряд (компенсация пропущенных кадров при низком FPS)."""
+        repeat = min(max(repeat, 1), self.length)
+        idx = (self._next + np.arange(repeat)) % self.length
+        self._data[idx] = keypoints
+        self._data[idx + self.length] = keypoints
+        self._next = (self._next + repeat) % self.length
+        self._count = min(self.length, self._count + repeat)
+
+    def view(self):
+        """Кадры от старого к новому, shape (len, size). Это вид на буфер, а не копия."""
+        start = (self._next - self._count) % self.length
+        return self._data[start:start + self._count]
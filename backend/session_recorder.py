@@ -0,0 +1,107 @@
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+
+# Запись сырых кадров /ws/hand_tracking для воспроизведения (replay_session.py).
+# Файл только дописывается: MAGIC, uint32 длина + JSON с описанием сессии, затем записи
+# "float64 время прихода (time.time()) + uint32 длина + байты кадра как пришли из сокета".
+# Пишет отдельный поток через ограниченную очередь: диск не тормозит цикл событий,
+# а если не успевает — кадр в запись не попадает (счетчик dropped), обработка идет как обычно.
+# Оборванный хвост (сервер упал посреди записи) при чтении просто отбрасывается.
+
+MAGIC = b"NBREC01\n"
+RECORD_EXTENSION = ".nbrec"
+_LENGTH = struct.Struct("<I")
+_RECORD = struct.Struct("<dI")
+
+
+class SessionRecorder:
+    def __init__(self, path, meta=None, max_bytes=0, queue_size=64):
+        self.path = path
+        self.max_bytes = max_bytes  # 0 — без ограничения
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopped = False
+
+        header = json.dumps(dict(meta or {}, started_at=time.time()), ensure_ascii=False).encode("utf-8")
+        self._file = open(path, "ab")
+        self._file.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        self._thread = threading.Thread(target=self._write_loop, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def create(cls, directory, meta=None, max_bytes=0):
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8] + RECORD_EXTENSION
+        return cls(os.path.join(directory, name), meta, max_bytes)
+
+    def write(self, payload, arrived_at=None):
+        if self._stopped:
+            return
+        if self.max_bytes and self.bytes + len(payload) > self.max_bytes:
+            self._stopped = True
+            print(f"[-] Запись сессии {self.path} остановлена: достигнут лимит {self.max_bytes} байт")
+            return
+        try:
+            self._queue.put_nowait((time.time() if arrived_at is None else arrived_at, payload))
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.frames += 1
+        self.bytes += len(payload)
+
+    def wrap(self, receive):
+        """receive() сокета, который заодно пишет каждый кадр в момент прихода."""
+        async def receive_and_record():
+            payload = await receive()
+            self.write(payload)
+            return payload
+        return receive_and_record
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            arrived_at, payload = item
+            self._file.write(_RECORD.pack(arrived_at, len(payload)))
+            self._file.write(payload)
+        self._file.close()
+
+    def close(self, wait=True):
+        """Останавливает запись; поток дописывает очередь и закрывает файл сам.
+        wait=False — не ждать его (из цикла событий)."""
+        self._stopped = True
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+
+def read_session(path):
+    """Возвращает (описание сессии, генератор (время прихода, кадр))."""
+    f = open(path, "rb")
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError(f"{path}: не файл записи сессии")
+    (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+    meta = json.loads(f.read(length).decode("utf-8"))
+
+    def records():
+        with f:
+            while True:
+                head = f.read(_RECORD.size)
+                if len(head) < _RECORD.size:
+                    return
+                arrived_at, size = _RECORD.unpack(head)
+                payload = f.read(size)
+                if len(payload) < size:
+                    return
+                yield arrived_at, payload
+
+    return meta, records()
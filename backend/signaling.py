@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+# WebRTC signaling relay. Every peer gets a bounded outbound queue drained by its own
+# sender task, so a message is serialized once per relay and a slow peer only delays itself.
+
+SLOW_PEER_DROP = "drop"              # Drop messages that do not fit into the peer's queue
+SLOW_PEER_DISCONNECT = "disconnect"  # Close the peer's socket so the client reconnects cleanly
+
+# Process-wide counters across all peers (for logs and /metrics)
+SIGNAL_TOTALS = {"dropped": 0, "slow_disconnects": 0}
+
+
+class PeerConnection:
+    def __init__(self, client_id, websocket, queue_size=256, slow_peer_policy=SLOW_PEER_DISCONNECT):
+        self.client_id = client_id
+        self.websocket = websocket
+        self.slow_peer_policy = slow_peer_policy
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self._sender_task = None
+
+    def start(self):
+        self._sender_task = asyncio.get_running_loop().create_task(self._send_loop())
+
+    async def _send_loop(self):
+        try:
+            while True:
+                text = await self.queue.get()
+                if text is None:
+                    break
+                await self.websocket.send_text(text)
+        except Exception:
+            # Socket is gone; the receive loop of this peer will clean it up
+            self.closed = True
+
+    def enqueue(self, text):
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            SIGNAL_TOTALS["dropped"] += 1
+            if self.slow_peer_policy == SLOW_PEER_DISCONNECT:
+                self.closed = True
+                SIGNAL_TOTALS["slow_disconnects"] += 1
+                print(f"[WS] ! Peer {self.client_id} is too slow, disconnecting ({self.queue.maxsize} messages queued)")
+                asyncio.get_running_loop().create_task(self._close_socket())
+            return False
+
+    async def _close_socket(self):
+        try:
+            # 1013 "Try Again Later"
+            await self.websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def stop(self):
+        self.closed = True
+        if self._sender_task is not None:
+            self._sender_task.cancel()
+            try:
+                await self._sender_task
+            except asyncio.CancelledError:
+                pass
+
+
+def broadcast(room, msg, exclude=None):
+    # Serialize once and fan out without awaiting any peer
+    text = msg if isinstance(msg, str) else json.dumps(msg)
+    for peer in list(room.values()):
+        if peer.client_id != exclude:
+            peer.enqueue(text)
+
+
+def make_local_delivery(rooms):
+    # Callback for the room bus: hand a relayed message to the peers connected to this worker
+    def deliver(room_id, text, target=None, exclude=None):
+        room = rooms.get(room_id)
+        if not room:
+            return
+        if target:
+            peer = room.get(target)
+            if peer is not None:
+                peer.enqueue(text)
+        else:
+            broadcast(room, text, exclude=exclude)
+    return deliver
+
+
+async def relay(bus, room_id, sender_id, msg):
+    target_id = msg.get("to")
+    # Ensure the message has a "from" assigned by the server for security
+    msg["from"] = sender_id
+    text = json.dumps(msg)
+    if target_id and await bus.is_member(room_id, target_id):
+        # Targeted sending (the recipient may live on another worker)
+        await bus.publish(room_id, text, target=target_id)
+    else:
+        # Generic broadcast
+        await bus.publish(room_id, text, exclude=sender_id)
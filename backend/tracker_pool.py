@@ -0,0 +1,245 @@
+import asyncio
+import itertools
+import multiprocessing as mp_proc
+import threading
+import time
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+# Пул процессов MediaPipe. Каждый процесс держит свои трекеры Hands, клиент навсегда
+# закреплен за одним процессом (static_image_mode=False хранит состояние трекинга между кадрами),
+# а сам кадр передается через shared memory клиента, по очереди идут только короткие команды.
+# У сессии не больше одного кадра в работе: пока воркер не ответил на прошлый (даже после
+# таймаута), сегмент не перезаписывается, а новый кадр отбрасывается (TrackerBusy).
+# Упавший воркер перезапускается, его клиенты переоткрываются в новом процессе.
+# Ответы каждый воркер шлет в свой канал (Pipe) без общих блокировок: воркер, убитый
+# посреди записи, не может намертво занять общую очередь результатов для остальных.
+
+WORKER_CHECK_INTERVAL_S = 1.0
+
+
+class TrackerBusy(RuntimeError):
+    """Воркер еще не ответил на прошлый кадр сессии: новый кадр пропущен."""
+
+
+def _worker_main(requests, results, hands_kwargs):
+    import mediapipe as mp
+
+    trackers = {}  # client_id -> (Hands, SharedMemory)
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        kind, client_id = message[0], message[1]
+        try:
+            if kind == "open":
+                trackers[client_id] = (mp.solutions.hands.Hands(**hands_kwargs), shared_memory.SharedMemory(name=message[2]))
+            elif kind == "remap":
+                hands, shm = trackers[client_id]
+                shm.close()
+                trackers[client_id] = (hands, shared_memory.SharedMemory(name=message[2]))
+            elif kind == "close":
+                hands, shm = trackers.pop(client_id, (None, None))
+                if hands is not None:
+                    hands.close()
+                    shm.close()
+            elif kind == "frame":
+                request_id, shape = message[2], message[3]
+                hands, shm = trackers[client_id]
+                image = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+                started = time.perf_counter()
+                packed = _pack_results(hands.process(image))
+                results.send((request_id, packed, None, time.perf_counter() - started))
+                del image
+        except Exception as e:
+            if kind == "frame":
+                results.send((message[2], None, str(e), 0.0))
+            else:
+                print(f"🚨 [ТРЕКЕР] Ошибка команды {kind} для клиента {client_id}: {e}")
+
+    for hands, shm in trackers.values():
+        hands.close()
+        shm.close()
+
+
+def _pack_results(results):
+    # Результаты MediaPipe не сериализуются, поэтому отдаем [(handedness, массив (21, 3))]
+    hands = []
+    if results.multi_hand_landmarks:
+        for idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
+            handedness = results.multi_handedness[idx].classification[0].label
+            landmarks = np.array([[lm.x, lm.y, lm.z] for lm in hand_landmarks.landmark], dtype=np.float32)
+            hands.append((handedness, landmarks))
+    return hands
+
+
+class TrackerSession:
+    def __init__(self, client_id, worker, shm):
+        self.client_id = client_id
+        self.worker = worker
+        self.shm = shm
+        self.last_process_s = 0.0  # Чистое время MediaPipe в воркере для последнего кадра (без IPC)
+        self.inflight = None  # request_id кадра, который воркер еще читает из shm
+        self.inflight_generation = 0
+
+
+class HandTrackerPool:
+    def __init__(self, num_workers, frame_bytes, hands_kwargs, timeout=5.0):
+        self.num_workers = max(1, num_workers)
+        self.frame_bytes = frame_bytes
+        self.hands_kwargs = hands_kwargs
+        self.timeout = timeout
+        self._context = mp_proc.get_context("spawn")
+        self._processes = []
+        self._requests = []
+        self._load = []
+        self._results = []  # Приемный конец канала ответов каждого воркера (None — воркер умер)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        # Перезапуск воркера (поток ответов) против открытия/закрытия сессий и отправки команд:
+        # иначе "open" уйдет в старую очередь или дважды — и в новую, и со списком переоткрываемых
+        self._workers_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._client_ids = itertools.count()
+        self._result_thread = None
+        self._sessions = {}  # client_id -> TrackerSession: для переоткрытия после перезапуска воркера
+        self._generations = []  # Номер запуска процесса воркера
+        self._closing = False
+
+    def start(self):
+        for _ in range(self.num_workers):
+            requests, results, process = self._spawn_worker()
+            self._processes.append(process)
+            self._requests.append(requests)
+            self._results.append(results)
+            self._load.append(0)
+            self._generations.append(0)
+        self._result_thread = threading.Thread(target=self._dispatch_results, name="tracker-results", daemon=True)
+        self._result_thread.start()
+        print(f"[+] Пул MediaPipe запущен: {self.num_workers} процессов")
+
+    def _spawn_worker(self, sessions=()):
+        requests = self._context.Queue()
+        for session in sessions:
+            requests.put(("open", session.client_id, session.shm.name))
+        results, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_worker_main, args=(requests, sender, self.hands_kwargs), daemon=True)
+        process.start()
+        sender.close()  # Пишущий конец остается только у воркера: его смерть — EOF в results
+        return requests, results, process
+
+    def open_session(self):
+        # Новый клиент уходит в наименее загруженный процесс и остается там до отключения
+        with self._workers_lock:
+            worker = min(range(self.num_workers), key=lambda i: self._load[i])
+            self._load[worker] += 1
+            try:
+                session = TrackerSession(next(self._client_ids), worker, shared_memory.SharedMemory(create=True, size=self.frame_bytes))
+            except Exception:
+                self._load[worker] -= 1
+                raise
+            self._sessions[session.client_id] = session
+            self._requests[worker].put(("open", session.client_id, session.shm.name))
+        return session
+
+    def close_session(self, session):
+        with self._workers_lock:
+            self._load[session.worker] -= 1
+            self._sessions.pop(session.client_id, None)
+            self._requests[session.worker].put(("close", session.client_id))
+        session.shm.close()
+        session.shm.unlink()
+
+    async def process(self, session, image):
+        """Отправляет RGB кадр в процесс клиента и возвращает [(handedness, landmarks (21, 3))].
+        TrackerBusy — прошлый кадр сессии еще в воркере, этот пропущен."""
+        if session.inflight is not None and session.inflight_generation == self._generations[session.worker]:
+            raise TrackerBusy(f"Воркер {session.worker} еще обрабатывает прошлый кадр клиента {session.client_id}")
+
+        if image.nbytes > session.shm.size:
+            # Кадр не влез в сегмент клиента: выделяем больший и переподключаем воркер
+            old = session.shm
+            session.shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+            with self._workers_lock:
+                self._requests[session.worker].put(("remap", session.client_id, session.shm.name))
+            old.close()
+            old.unlink()
+
+        np.ndarray(image.shape, dtype=np.uint8, buffer=session.shm.buf)[...] = image
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request_id = next(self._request_ids)
+        with self._workers_lock:
+            session.inflight = request_id
+            session.inflight_generation = self._generations[session.worker]
+            with self._pending_lock:
+                self._pending[request_id] = (loop, future, session)
+            self._requests[session.worker].put(("frame", session.client_id, request_id, image.shape))
+        # По таймауту запрос остается в _pending: сегмент освободится, только когда воркер ответит
+        return await asyncio.wait_for(future, self.timeout)
+
+    def _dispatch_results(self):
+        checked_at = time.monotonic()
+        while not self._closing:
+            ready = connection.wait([r for r in self._results if r is not None], timeout=WORKER_CHECK_INTERVAL_S)
+            for results in ready:
+                try:
+                    request_id, hands, error, process_s = results.recv()
+                except (EOFError, OSError):
+                    # Воркер умер: канал больше не слушаем, перезапустит _check_workers
+                    self._results[self._results.index(results)] = None
+                    results.close()
+                    continue
+                with self._pending_lock:
+                    pending = self._pending.pop(request_id, None)
+                if pending is not None:
+                    loop, future, session = pending
+                    session.last_process_s = process_s
+                    loop.call_soon_threadsafe(self._resolve, session, request_id, future, hands, error)
+            if time.monotonic() - checked_at >= WORKER_CHECK_INTERVAL_S:
+                checked_at = time.monotonic()
+                self._check_workers()
+
+    def _check_workers(self):
+        for worker, process in enumerate(self._processes):
+            if self._closing or process.is_alive():
+                continue
+            # Воркер упал: новый процесс со своими очередью и каналом (старая очередь могла остаться
+            # под замком умершего процесса), сессии клиентов переоткрываются, кадры в работе — с ошибкой
+            with self._workers_lock:
+                sessions = [s for s in self._sessions.values() if s.worker == worker]
+                print(f"🚨 [ТРЕКЕР] Процесс {worker} упал (код {process.exitcode}), перезапуск; клиентов: {len(sessions)}")
+                if self._results[worker] is not None:
+                    self._results[worker].close()
+                self._requests[worker], self._results[worker], self._processes[worker] = self._spawn_worker(sessions)
+                self._generations[worker] += 1
+                with self._pending_lock:
+                    lost = [(rid, p) for rid, p in self._pending.items() if p[2].worker == worker]
+                    for request_id, _ in lost:
+                        del self._pending[request_id]
+            for request_id, (loop, future, session) in lost:
+                loop.call_soon_threadsafe(self._resolve, session, request_id, future, None, "процесс MediaPipe перезапущен")
+
+    @staticmethod
+    def _resolve(session, request_id, future, hands, error):
+        if session.inflight == request_id:
+            session.inflight = None
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(hands)
+
+    def shutdown(self):
+        self._closing = True
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        # Поток ответов выходит сам, увидев _closing (не позже чем через WORKER_CHECK_INTERVAL_S)
+        self._processes, self._requests, self._load = [], [], []